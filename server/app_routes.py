@@ -5,13 +5,13 @@ App 前端 API 路由
 
 import os
 import uuid
-import httpx
+import aiofiles
+import orjson
 import mimetypes
 from typing import List, Optional
 from datetime import datetime
 from fastapi import APIRouter, Depends, HTTPException, File, UploadFile, Form, Request
 from fastapi.responses import StreamingResponse, FileResponse
-from pydantic import BaseModel
 from sqlalchemy.orm import Session
 from sqlalchemy import func, distinct
 from urllib.parse import urljoin
@@ -24,34 +24,39 @@ from database import (
     get_user_dubbings_by_user, count_user_dubbings_by_user,
     get_public_user_dubbings, count_public_user_dubbings, delete_user_dubbing
 )
+from notify import notify_new_vocal_task, notify_new_composite_task
+from http_client import get_http_client, get_base_url
 from schemas import (
     AppCartoonResponse, AppSeasonResponse, 
     AppEpisodeResponse, AppDubbingClipResponse,
     UserLearningStatsResponse, AppRecommendedClipResponse,
-    PaginatedResponse
+    PaginatedResponse,
+    VocalRemovalRequest, VocalRemovalResponse,
+    CompositeVideoResponse, UserDubbingResponse
 )
 import math
 
 router = APIRouter(prefix="/api/app", tags=["App接口"])
 
+UPLOAD_CHUNK_SIZE = 1024 * 1024  # 上传文件分块写入大小
+
 
 async def fetch_json(url: str) -> dict:
     """从 URL 获取 JSON 数据"""
     try:
-        async with httpx.AsyncClient(timeout=30.0) as client:
-            response = await client.get(url)
-            response.raise_for_status()
-            return response.json()
+        client = get_http_client()
+        response = await client.get(url, timeout=30.0)
+        response.raise_for_status()
+        return orjson.loads(response.content)
     except Exception as e:
         raise HTTPException(status_code=502, detail=f"无法获取远程数据: {str(e)}")
 
 
-def get_base_url(all_json_url: str) -> str:
-    """从 all.json URL 获取基础 URL"""
-    # 例如: https://example.com/peppa/s1/all.json -> https://example.com/peppa/s1/
-    if all_json_url.endswith('/all.json'):
-        return all_json_url[:-8]  # 移除 'all.json'
-    return all_json_url.rsplit('/', 1)[0] + '/'
+async def save_upload_file(upload: UploadFile, path: str):
+    """分块将上传文件写入磁盘（aiofiles 在线程池中写入，不阻塞事件循环）"""
+    async with aiofiles.open(path, 'wb') as f:
+        while chunk := await upload.read(UPLOAD_CHUNK_SIZE):
+            await f.write(chunk)
 
 
 @router.get("/cartoons")
@@ -471,20 +476,6 @@ def get_recommendations(
 
 # ===== 人声去除接口 =====
 
-
-class VocalRemovalRequest(BaseModel):
-    """人声去除请求"""
-    video_url: str  # 视频URL，作为缓存key
-
-
-class VocalRemovalResponse(BaseModel):
-    """人声去除响应"""
-    status: str  # pending, processing, completed, failed
-    video_url: str  # 原始视频URL
-    output_video_path: Optional[str] = None  # 处理后的视频路径
-    error_message: Optional[str] = None  # 错误信息
-
-
 @router.post("/vocal-removal", response_model=VocalRemovalResponse)
 def request_vocal_removal(
     request: VocalRemovalRequest,
@@ -521,8 +512,9 @@ def request_vocal_removal(
                 error_message=existing_task.error_message
             )
     
-    # 创建新任务
+    # 创建新任务，并通知 Worker 立即处理
     new_task = create_vocal_removal_task(db, video_url)
+    notify_new_vocal_task()
     
     return VocalRemovalResponse(
         status=new_task.status,
@@ -567,32 +559,6 @@ USER_DUBBINGS_DIR = os.path.join(os.path.dirname(__file__), "user_dubbings")
 os.makedirs(USER_AUDIO_DIR, exist_ok=True)
 os.makedirs(USER_DUBBINGS_DIR, exist_ok=True)
 
-
-class CompositeVideoResponse(BaseModel):
-    """视频合成响应"""
-    task_id: int
-    status: str  # pending, processing, completed, failed
-    composite_video_path: Optional[str] = None
-    error_message: Optional[str] = None
-
-
-class UserDubbingResponse(BaseModel):
-    """用户配音响应"""
-    id: int
-    user_id: str
-    clip_path: str
-    season_id: Optional[str] = None
-    original_video_url: str
-    composite_video_path: Optional[str] = None
-    status: str
-    is_public: bool
-    original_text: Optional[str] = None
-    translation_cn: Optional[str] = None
-    thumbnail: Optional[str] = None
-    duration: float
-    created_at: str
-
-
 # 用户视频存储目录（视频配音模式）
 USER_VIDEOS_DIR = os.path.join(os.path.dirname(__file__), "user_videos")
 os.makedirs(USER_VIDEOS_DIR, exist_ok=True)
@@ -635,9 +601,7 @@ async def create_composite_video(
             video_filename = f"{uuid.uuid4().hex}_{user_video.filename or 'camera.mp4'}"
             video_path = os.path.join(USER_VIDEOS_DIR, video_filename)
             
-            content = await user_video.read()
-            with open(video_path, 'wb') as f:
-                f.write(content)
+            await save_upload_file(user_video, video_path)
             
             user_video_path = f"/user_videos/{video_filename}"
         else:
@@ -649,9 +613,7 @@ async def create_composite_video(
             audio_filename = f"{uuid.uuid4().hex}_{audio.filename or 'recording.m4a'}"
             audio_path = os.path.join(USER_AUDIO_DIR, audio_filename)
             
-            content = await audio.read()
-            with open(audio_path, 'wb') as f:
-                f.write(content)
+            await save_upload_file(audio, audio_path)
             
             user_audio_path = f"/user_audio/{audio_filename}"
         
@@ -671,6 +633,7 @@ async def create_composite_video(
             thumbnail=thumbnail,
             duration=duration
         )
+        notify_new_composite_task()
         
         return CompositeVideoResponse(
             task_id=dubbing.id,
@@ -5,7 +5,7 @@
 
 import os
 import hashlib
-from datetime import datetime
+from datetime import datetime, timedelta
 from typing import List, Optional
 
 # 尝试加载 .env 文件
@@ -15,7 +15,7 @@ try:
 except ImportError:
     pass
 
-from sqlalchemy import create_engine, Column, Integer, String, Float, Text, DateTime, ForeignKey, Boolean
+from sqlalchemy import create_engine, Column, Integer, String, Float, Text, DateTime, ForeignKey, Boolean, select, update, or_, and_
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker, relationship, Session
 
@@ -168,7 +168,7 @@ class MediaCache(Base):
     __tablename__ = "media_cache"
     
     id = Column(Integer, primary_key=True, autoincrement=True)
-    cache_key = Column(String(500), unique=True, nullable=False, index=True)  # 如: "md5hash:background" 或 "md5hash:mute-video"
+    cache_key = Column(String(500), unique=True, nullable=False, index=True)  # 如: "urlhash:background" 或 "urlhash:mute-video"
     cache_type = Column(String(50), nullable=False)  # "background", "mute-video"
     file_path = Column(String(500), nullable=False)  # 缓存文件路径
     source_url = Column(String(1000), nullable=False)  # 原始视频URL
@@ -453,6 +453,23 @@ def add_recommended_clip(db: Session, clip_data: dict) -> RecommendedClip:
     return clip
 
 
+def replace_recommended_clips(db: Session, clips_data: List[dict]) -> int:
+    """
+    用新的推荐片段整体替换现有推荐
+    删除和批量插入在同一个事务中提交，客户端不会看到空的推荐列表
+    插入使用 Core executemany，一条语句写入所有行
+    """
+    try:
+        db.execute(RecommendedClip.__table__.delete())
+        if clips_data:
+            db.execute(RecommendedClip.__table__.insert(), clips_data)
+        db.commit()
+    except Exception:
+        db.rollback()
+        raise
+    return len(clips_data)
+
+
 def get_recommended_clips(db: Session) -> list:
     """获取所有推荐片段"""
     return db.query(RecommendedClip).order_by(RecommendedClip.sort_order).all()
@@ -490,6 +507,97 @@ def get_pending_vocal_removal_tasks(db: Session) -> list:
     return db.query(VocalRemovalTask).filter(VocalRemovalTask.status == "pending").all()
 
 
+# processing 状态超过该时长（秒）未刷新 updated_at 视为 Worker 已崩溃，任务可被重新领取；0 表示不回收
+# Worker 处理任务期间每 TASK_PROCESSING_TIMEOUT / 3 秒刷新一次 updated_at（心跳）
+TASK_PROCESSING_TIMEOUT = int(os.environ.get("TASK_PROCESSING_TIMEOUT", 3600))
+
+
+def _supports_skip_locked(dialect) -> bool:
+    """数据库是否支持 SELECT ... FOR UPDATE SKIP LOCKED（MySQL 8 / MariaDB 10.6 / PostgreSQL）"""
+    if dialect.name == "postgresql":
+        return True
+    if dialect.name in ("mysql", "mariadb"):
+        version = dialect.server_version_info or ()
+        if getattr(dialect, "is_mariadb", False):
+            return version >= (10, 6)
+        return version >= (8, 0)
+    return False
+
+
+def _claimable(model):
+    """可领取条件：pending，或 processing 且超时未更新（Worker 崩溃遗留）"""
+    if TASK_PROCESSING_TIMEOUT <= 0:
+        return model.status == "pending"
+    stale_before = datetime.utcnow() - timedelta(seconds=TASK_PROCESSING_TIMEOUT)
+    return or_(
+        model.status == "pending",
+        and_(model.status == "processing", model.updated_at < stale_before),
+    )
+
+
+def _claim_pending(db: Session, model, limit: Optional[int]) -> list:
+    """
+    原子地领取待处理任务：pending -> processing，返回领取到的记录
+    - processing 超过 TASK_PROCESSING_TIMEOUT 未心跳的任务视为 Worker 崩溃遗留，重新领取
+    - 支持 SKIP LOCKED 的数据库（MySQL 8 / MariaDB 10.6 / PostgreSQL）跳过其他 Worker 已锁定的行
+    - 只返回本次真正更新的行：支持 UPDATE ... RETURNING 的数据库（SQLite 3.35+ / PostgreSQL）一条语句完成，
+      其他数据库（MySQL）逐行更新并检查 rowcount
+    """
+    try:
+        dialect = db.get_bind().dialect
+        claimable = _claimable(model)
+        id_query = select(model.id).where(claimable).order_by(model.id)
+        if limit:
+            id_query = id_query.limit(limit)
+        if _supports_skip_locked(dialect):
+            id_query = id_query.with_for_update(skip_locked=True)
+        ids = db.execute(id_query).scalars().all()
+        if not ids:
+            db.commit()
+            return []
+        
+        # UPDATE 中重复可领取条件：另一 Worker 已领取的行不会被更新，也不会被返回
+        claim = update(model).where(claimable).values(status="processing", updated_at=datetime.utcnow())
+        
+        if dialect.update_returning:
+            ids = db.execute(
+                claim.where(model.id.in_(ids)).returning(model.id),
+                execution_options={"synchronize_session": False}
+            ).scalars().all()
+        else:
+            ids = [
+                task_id for task_id in ids
+                if db.execute(
+                    claim.where(model.id == task_id),
+                    execution_options={"synchronize_session": False}
+                ).rowcount == 1
+            ]
+        db.commit()
+    except Exception:
+        db.rollback()
+        raise
+    
+    if not ids:
+        return []
+    return db.query(model).filter(model.id.in_(ids)).order_by(model.id).all()
+
+
+def touch_processing_task(db: Session, model, task_id: int) -> bool:
+    """刷新处理中任务的 updated_at（心跳），避免耗时任务被当作崩溃遗留而重复领取"""
+    result = db.execute(
+        update(model).where(model.id == task_id, model.status == "processing")
+        .values(updated_at=datetime.utcnow()),
+        execution_options={"synchronize_session": False}
+    )
+    db.commit()
+    return result.rowcount == 1
+
+
+def claim_pending_vocal_removal_tasks(db: Session, limit: Optional[int] = None) -> list:
+    """领取待处理的人声去除任务（状态置为 processing）"""
+    return _claim_pending(db, VocalRemovalTask, limit)
+
+
 def delete_vocal_removal_task(db: Session, video_url: str) -> bool:
     """删除指定的人声去除任务"""
     result = db.query(VocalRemovalTask).filter(VocalRemovalTask.video_url == video_url).delete()
@@ -524,6 +632,22 @@ def create_media_cache(db: Session, cache_key: str, cache_type: str, file_path:
     return cache
 
 
+def bulk_create_media_cache(db: Session, rows: List[dict]) -> int:
+    """
+    批量创建媒体缓存记录（Core executemany，一次提交）
+    rows 中每项包含 cache_key / cache_type / file_path / source_url
+    """
+    if not rows:
+        return 0
+    try:
+        db.execute(MediaCache.__table__.insert(), rows)
+        db.commit()
+    except Exception:
+        db.rollback()
+        raise
+    return len(rows)
+
+
 def get_media_cache_by_url_and_type(db: Session, source_url: str, cache_type: str) -> Optional[MediaCache]:
     """根据源URL和缓存类型获取媒体缓存"""
     return db.query(MediaCache).filter(
@@ -564,6 +688,11 @@ def get_pending_user_dubbings(db: Session) -> list:
     return db.query(UserDubbing).filter(UserDubbing.status == "pending").all()
 
 
+def claim_pending_user_dubbings(db: Session, limit: Optional[int] = None) -> list:
+    """领取待处理的用户配音任务（状态置为 processing）"""
+    return _claim_pending(db, UserDubbing, limit)
+
+
 def get_user_dubbings_by_user(db: Session, user_id: str, offset: int = 0, limit: int = 20) -> list:
     """获取用户的配音列表"""
     return db.query(UserDubbing).filter(
@@ -0,0 +1,74 @@
+"""
+共享 HTTP 客户端
+进程内复用同一个 httpx.AsyncClient，保持连接池和 keep-alive，
+避免每次请求都重新建立 TCP + TLS 连接；另提供 API 与 Worker 共用的远程 URL 工具函数
+"""
+
+import logging
+from functools import lru_cache
+from typing import Optional
+
+import httpx
+
+try:
+    import h2  # noqa: F401  httpx 的 HTTP/2 支持依赖 h2
+    HTTP2_AVAILABLE = True
+except ImportError:
+    HTTP2_AVAILABLE = False
+
+logger = logging.getLogger(__name__)
+
+# 连接池配置
+HTTP_MAX_CONNECTIONS = 128
+HTTP_MAX_KEEPALIVE_CONNECTIONS = 32
+
+# 默认超时时间（秒），具体请求可通过 timeout 参数覆盖
+HTTP_DEFAULT_TIMEOUT = 30.0
+
+_client: Optional[httpx.AsyncClient] = None
+
+
+def get_http_client() -> httpx.AsyncClient:
+    """
+    获取共享的 AsyncClient（首次调用时创建）
+    
+    必须在事件循环内调用；客户端绑定到创建它的事件循环
+    """
+    global _client
+    
+    if _client is None or _client.is_closed:
+        _client = httpx.AsyncClient(
+            http2=HTTP2_AVAILABLE,
+            timeout=HTTP_DEFAULT_TIMEOUT,
+            limits=httpx.Limits(
+                max_connections=HTTP_MAX_CONNECTIONS,
+                max_keepalive_connections=HTTP_MAX_KEEPALIVE_CONNECTIONS
+            ),
+            # 安装 brotli 后 httpx 会自动在 Accept-Encoding 中加入 br
+            headers={"User-Agent": "peiyin2"}
+        )
+        logger.info(f"共享 HTTP 客户端已创建 (http2={HTTP2_AVAILABLE})")
+    
+    return _client
+
+
+async def close_http_client():
+    """关闭共享的 AsyncClient（应用或 Worker 退出时调用）"""
+    global _client
+    
+    if _client is not None and not _client.is_closed:
+        await _client.aclose()
+        logger.info("共享 HTTP 客户端已关闭")
+    _client = None
+
+
+@lru_cache(maxsize=4096)
+def get_base_url(all_json_url: str) -> str:
+    """从 all.json URL 获取基础 URL"""
+    # 例如: https://example.com/peppa/s1/all.json -> https://example.com/peppa/s1/
+    if all_json_url.endswith('/all.json'):
+        return all_json_url[:-8]  # 移除 'all.json'
+    return all_json_url.rsplit('/', 1)[0] + '/'
+
+
+__all__ = ['get_http_client', 'close_http_client', 'get_base_url', 'HTTP2_AVAILABLE']
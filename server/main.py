@@ -5,6 +5,7 @@
 
 import os
 import json
+import random
 import tempfile
 import logging
 from typing import Optional
@@ -12,13 +13,14 @@ from pathlib import Path
 
 from fastapi import FastAPI, File, UploadFile, Form, HTTPException, Depends
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import JSONResponse, HTMLResponse, FileResponse
+from fastapi.responses import JSONResponse, HTMLResponse, FileResponse, ORJSONResponse
 from fastapi.staticfiles import StaticFiles
-from pydantic import BaseModel
 from sqlalchemy.orm import Session
 
 from scoring import VoskScorer, ScoringResult
+from http_client import close_http_client
 from database import init_db, get_db, init_sample_data, DubbingRecord
+from schemas import ScoreResponse, SaveScoreRequest
 from admin_routes import router as admin_router
 from app_routes import router as app_router
 
@@ -32,7 +34,8 @@ logger = logging.getLogger(__name__)
 app = FastAPI(
     title="英语配音评分服务",
     description="使用远程 Vosk 服务进行音素级对齐和评分的 API 服务",
-    version="1.0.0"
+    version="1.0.0",
+    default_response_class=ORJSONResponse  # 使用 orjson 序列化所有 JSON 响应
 )
 
 # 配置 CORS
@@ -52,6 +55,7 @@ USER_AUDIO_DIR = os.path.join(os.path.dirname(__file__), "user_audio")
 USER_VIDEOS_DIR = os.path.join(os.path.dirname(__file__), "user_videos")
 USER_DUBBINGS_DIR = os.path.join(os.path.dirname(__file__), "user_dubbings")
 MEDIA_CACHE_DIR = os.path.join(os.path.dirname(__file__), "media_cache")
+UPLOAD_CHUNK_SIZE = 1024 * 1024  # 上传文件分块读取大小
 os.makedirs(STATIC_DIR, exist_ok=True)
 os.makedirs(UPLOAD_DIR, exist_ok=True)
 os.makedirs(VOCAL_REMOVED_DIR, exist_ok=True)
@@ -101,6 +105,11 @@ async def startup_event():
     # 注意：Worker 需要单独启动，运行 python run_worker.py
     logger.info("API 服务已启动（Worker 需单独运行）")
 
+@app.on_event("shutdown")
+async def shutdown_event():
+    """应用关闭时释放共享 HTTP 连接池"""
+    await close_http_client()
+
 @app.get("/")
 async def root():
     """根路径 - 重定向到管理后台"""
@@ -129,28 +138,11 @@ async def health_check():
     """健康检查"""
     return {
         "status": "healthy",
-        "scorer_available": scorer is not None
+        "scorer_available": scorer is not None,
+        "score_cache": scorer.cache_stats() if scorer is not None else None
     }
 
 
-class ScoreResponse(BaseModel):
-    """评分响应模型"""
-    overallScore: int
-    phonemeScores: list
-    wordScores: list
-    feedback: str
-
-
-class SaveScoreRequest(BaseModel):
-    """保存评分请求模型"""
-    user_id: str
-    clip_path: str
-    season_id: Optional[str] = None
-    score: int
-    feedback: str
-    word_scores: list
-
-
 @app.post("/api/save-score")
 async def save_score(
     request: SaveScoreRequest,
@@ -185,6 +177,16 @@ async def save_score(
         return {"status": "error", "message": str(e)}
 
 
+def get_temp_file_path(temp_file) -> str:
+    """
+    获取已打开临时文件的访问路径
+    POSIX 上 TemporaryFile 没有文件名（name 为 fd），通过 /dev/fd 访问
+    """
+    if isinstance(temp_file.name, int):
+        return f"/dev/fd/{temp_file.name}"
+    return temp_file.name
+
+
 @app.post("/api/score", response_model=ScoreResponse)
 async def score_audio(
     audio: UploadFile = File(...),
@@ -210,21 +212,24 @@ async def score_audio(
     logger.info(f"收到评分请求: clip_path={clip_path}, season_id={season_id}, text={text}")
     
     try:
-        # 保存上传的音频文件到临时目录
-        with tempfile.NamedTemporaryFile(delete=False, suffix=".m4a") as temp_file:
-            content = await audio.read()
-            temp_file.write(content)
-            temp_audio_path = temp_file.name
-        
-        logger.info(f"音频文件已保存: {temp_audio_path}")
-        
-        # 进行评分
-        if scorer is not None:
-            result = scorer.score(temp_audio_path, text)
-        else:
-            # 模拟评分
-            logger.info("使用模拟评分模式")
-            result = generate_mock_score(text)
+        # 将上传的音频流式写入匿名临时文件
+        # TemporaryFile 在 Linux 上使用 O_TMPFILE，不产生目录项，关闭后由内核自动回收，无需 unlink
+        with tempfile.TemporaryFile(suffix=".m4a") as temp_file:
+            while chunk := await audio.read(UPLOAD_CHUNK_SIZE):
+                temp_file.write(chunk)
+            temp_file.flush()
+            temp_file.seek(0)
+            temp_audio_path = get_temp_file_path(temp_file)
+            
+            logger.info(f"音频文件已保存: {temp_audio_path}")
+            
+            # 进行评分
+            if scorer is not None:
+                result = await scorer.score_async(temp_audio_path, text, filename=audio.filename)
+            else:
+                # 模拟评分
+                logger.info("使用模拟评分模式")
+                result = generate_mock_score(text)
         
         # 保存配音记录到数据库
         try:
@@ -241,12 +246,6 @@ async def score_audio(
         except Exception as e:
             logger.error(f"保存配音记录失败: {e}")
         
-        # 清理临时文件
-        try:
-            os.unlink(temp_audio_path)
-        except:
-            pass
-        
         return result
         
     except Exception as e:
@@ -260,36 +259,30 @@ def generate_mock_score(text: str) -> dict:
     生成模拟评分结果
     用于演示或当 Vosk 不可用时
     """
-    import random
-    
-    words = text.split()
-    word_scores = []
-    total_score = 0
-    
-    for word in words:
-        # 生成随机分数 (60-100)
-        word_score = random.randint(60, 100)
-        total_score += word_score
-        
-        # 生成音素分数
-        phoneme_scores = []
-        for i, char in enumerate(word.lower()):
-            if char.isalpha():
-                phoneme_scores.append({
+    randint = random.randint
+    word_scores = [
+        {
+            "word": word,
+            # 生成随机分数 (60-100)
+            "score": randint(60, 100),
+            # 生成音素分数
+            "phonemes": [
+                {
                     "phoneme": char,
-                    "score": random.randint(60, 100),
+                    "score": randint(60, 100),
                     "startTime": i * 0.1,
                     "endTime": (i + 1) * 0.1
-                })
-        
-        word_scores.append({
-            "word": word,
-            "score": word_score,
-            "phonemes": phoneme_scores
-        })
+                }
+                for i, char in enumerate(word.lower())
+                if char.isalpha()
+            ]
+        }
+        for word in text.split()
+    ]
+    total_score = sum(w["score"] for w in word_scores)
     
     # 计算平均分
-    overall_score = total_score // len(words) if words else 0
+    overall_score = total_score // len(word_scores) if word_scores else 0
     
     # 生成反馈
     if overall_score >= 90:
@@ -0,0 +1,89 @@
+"""
+新任务通知
+API 创建任务后调用 notify_new_*_task 唤醒 Worker，Worker 不必频繁轮询数据库
+同进程时直接唤醒；独立 Worker 进程通过 UDP 数据报唤醒（SQLite / MySQL 没有 LISTEN/NOTIFY）
+"""
+
+import asyncio
+import logging
+import os
+import socket
+from typing import Optional
+
+logger = logging.getLogger(__name__)
+
+# Worker 监听的通知地址；API 与 Worker 不在同一台机器 / 容器时改为 Worker 可达的地址，
+# 设为空字符串则只靠轮询
+WORKER_NOTIFY_ADDR = os.environ.get("WORKER_NOTIFY_ADDR", "127.0.0.1:8731")
+
+
+def parse_notify_addr() -> Optional[tuple]:
+    """解析 WORKER_NOTIFY_ADDR 为 (host, port)，未配置时返回 None"""
+    if not WORKER_NOTIFY_ADDR:
+        return None
+    host, _, port = WORKER_NOTIFY_ADDR.rpartition(':')
+    return (host or '127.0.0.1', int(port))
+
+
+class TaskNotifier:
+    """某一类任务的唤醒信号，绑定到 Worker 所在的事件循环"""
+    
+    def __init__(self):
+        self._event: Optional[asyncio.Event] = None
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+    
+    def bind(self):
+        """在 Worker 协程中调用，创建绑定当前事件循环的 Event"""
+        self._event = asyncio.Event()
+        self._loop = asyncio.get_running_loop()
+    
+    def set(self):
+        """线程安全地唤醒 Worker；Worker 未在本进程运行时不做任何事"""
+        if self._event is not None and self._loop is not None:
+            self._loop.call_soon_threadsafe(self._event.set)
+    
+    def clear(self):
+        self._event.clear()
+    
+    async def wait(self, timeout: float):
+        """等待通知，超时后返回（用于兜底轮询）"""
+        try:
+            await asyncio.wait_for(self._event.wait(), timeout=timeout)
+        except asyncio.TimeoutError:
+            pass
+
+
+task_notifiers = {
+    "vocal": TaskNotifier(),
+    "composite": TaskNotifier(),
+}
+
+
+def _notify(kind: str):
+    """唤醒同进程的 Worker，并向独立 Worker 进程发送通知（失败时静默，由轮询兜底）"""
+    task_notifiers[kind].set()
+    
+    addr = parse_notify_addr()
+    if addr is None:
+        return
+    try:
+        with socket.socket(socket.AF_INET, socket.SOCK_DGRAM) as sock:
+            sock.sendto(kind.encode(), addr)
+    except OSError as e:
+        logger.debug(f"发送任务通知失败: {e}")
+
+
+def notify_new_vocal_task():
+    """通知人声去除 Worker 立即检查新任务（线程安全，可在同步路由中调用）"""
+    _notify("vocal")
+
+
+def notify_new_composite_task():
+    """通知视频合成 Worker 立即检查新任务（线程安全，可在同步路由中调用）"""
+    _notify("composite")
+
+
+__all__ = [
+    'WORKER_NOTIFY_ADDR', 'parse_notify_addr', 'TaskNotifier', 'task_notifiers',
+    'notify_new_vocal_task', 'notify_new_composite_task'
+]
@@ -12,7 +12,11 @@ import asyncio
 import logging
 
 from database import init_db
-from worker import recommendation_worker, vocal_removal_worker, composite_video_worker
+from worker import (
+    recommendation_worker, vocal_removal_worker, composite_video_worker,
+    shutdown_demucs_pool, enable_eager_task_factory, close_notify_listener
+)
+from http_client import close_http_client
 
 # 配置日志
 logging.basicConfig(
@@ -32,6 +36,9 @@ async def main():
     init_db()
     logger.info("数据库初始化完成")
     
+    # Python 3.12+ 启用 eager task factory，减少短任务的调度开销
+    enable_eager_task_factory()
+    
     # 创建所有 Worker 任务
     tasks = [
         asyncio.create_task(recommendation_worker()),
@@ -56,6 +63,9 @@ async def main():
         # 取消所有任务
         for task in tasks:
             task.cancel()
+        await close_http_client()
+        shutdown_demucs_pool()
+        close_notify_listener()
         logger.info("所有 Worker 已停止")
 
 
@@ -4,7 +4,7 @@ Pydantic 数据模式定义
 
 from datetime import datetime
 from typing import List, Optional, Generic, TypeVar
-from pydantic import BaseModel
+from pydantic import BaseModel, ConfigDict
 
 # 泛型类型变量，用于分页响应
 T = TypeVar('T')
@@ -47,8 +47,7 @@ class CartoonResponse(CartoonBase):
     created_at: datetime
     updated_at: datetime
     
-    class Config:
-        from_attributes = True
+    model_config = ConfigDict(from_attributes=True)
 
 
 class CartoonListResponse(BaseModel):
@@ -61,8 +60,7 @@ class CartoonListResponse(BaseModel):
     sort_order: int = 0
     season_count: int = 0
     
-    class Config:
-        from_attributes = True
+    model_config = ConfigDict(from_attributes=True)
 
 
 # ===== 季 =====
@@ -88,8 +86,7 @@ class SeasonResponse(SeasonBase):
     cartoon_id: str
     created_at: datetime
     
-    class Config:
-        from_attributes = True
+    model_config = ConfigDict(from_attributes=True)
 
 
 class SeasonListResponse(BaseModel):
@@ -99,8 +96,7 @@ class SeasonListResponse(BaseModel):
     all_json_url: Optional[str]
     is_active: bool
     
-    class Config:
-        from_attributes = True
+    model_config = ConfigDict(from_attributes=True)
 
 
 # ===== 集（从 JSON 动态获取，不存储在数据库）=====
@@ -137,8 +133,7 @@ class DubbingRecordResponse(BaseModel):
     feedback: Optional[str] = None
     created_at: datetime
     
-    class Config:
-        from_attributes = True
+    model_config = ConfigDict(from_attributes=True)
 
 
 # ===== 统计 =====
@@ -167,8 +162,7 @@ class AppCartoonResponse(BaseModel):
     thumbnail: Optional[str]
     description: Optional[str]
     
-    class Config:
-        from_attributes = True
+    model_config = ConfigDict(from_attributes=True)
 
 
 class AppSeasonResponse(BaseModel):
@@ -177,8 +171,7 @@ class AppSeasonResponse(BaseModel):
     cartoonId: str
     allJsonUrl: Optional[str]
     
-    class Config:
-        from_attributes = True
+    model_config = ConfigDict(from_attributes=True)
 
 
 class AppEpisodeResponse(BaseModel):
@@ -201,8 +194,7 @@ class AppDubbingClipResponse(BaseModel):
     thumbnail: Optional[str]
     duration: float
     
-    class Config:
-        from_attributes = True
+    model_config = ConfigDict(from_attributes=True)
 
 
 class AppRecommendedClipResponse(BaseModel):
@@ -217,5 +209,63 @@ class AppRecommendedClipResponse(BaseModel):
     translationCN: Optional[str]
     duration: float
     
-    class Config:
-        from_attributes = True
+    model_config = ConfigDict(from_attributes=True)
+
+
+# ===== 评分 =====
+class ScoreResponse(BaseModel):
+    """评分响应模型"""
+    overallScore: int
+    phonemeScores: list
+    wordScores: list
+    feedback: str
+
+
+class SaveScoreRequest(BaseModel):
+    """保存评分请求模型"""
+    user_id: str
+    clip_path: str
+    season_id: Optional[str] = None
+    score: int
+    feedback: str
+    word_scores: list
+
+
+# ===== 人声去除 =====
+class VocalRemovalRequest(BaseModel):
+    """人声去除请求"""
+    video_url: str  # 视频URL，作为缓存key
+
+
+class VocalRemovalResponse(BaseModel):
+    """人声去除响应"""
+    status: str  # pending, processing, completed, failed
+    video_url: str  # 原始视频URL
+    output_video_path: Optional[str] = None  # 处理后的视频路径
+    error_message: Optional[str] = None  # 错误信息
+
+
+# ===== 视频合成 =====
+class CompositeVideoResponse(BaseModel):
+    """视频合成响应"""
+    task_id: int
+    status: str  # pending, processing, completed, failed
+    composite_video_path: Optional[str] = None
+    error_message: Optional[str] = None
+
+
+class UserDubbingResponse(BaseModel):
+    """用户配音响应"""
+    id: int
+    user_id: str
+    clip_path: str
+    season_id: Optional[str] = None
+    original_video_url: str
+    composite_video_path: Optional[str] = None
+    status: str
+    is_public: bool
+    original_text: Optional[str] = None
+    translation_cn: Optional[str] = None
+    thumbnail: Optional[str] = None
+    duration: float
+    created_at: str
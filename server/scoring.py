@@ -4,11 +4,23 @@ Vosk 语音评分模块
 """
 
 import os
+import re
+import random
+import asyncio
+import hashlib
 import logging
 import httpx
-from typing import List, Dict, Any
+import orjson
+from typing import List, Dict, Any, Optional
 from dataclasses import dataclass
 
+from http_client import get_http_client
+
+try:
+    import diskcache
+except ImportError:
+    diskcache = None
+
 logger = logging.getLogger(__name__)
 
 # Vosk 远程服务地址
@@ -17,6 +29,33 @@ VOSK_SERVICE_URL = os.environ.get("VOSK_SERVICE_URL", "https://vosk.coding61.com
 # 请求超时时间（秒）
 VOSK_TIMEOUT = int(os.environ.get("VOSK_TIMEOUT", 60))
 
+# 并发请求远程服务的上限，避免突发流量触发限流
+VOSK_MAX_CONCURRENCY = int(os.environ.get("VOSK_MAX_CONCURRENCY", 8))
+
+# 遇到限流 / 网关错误 / 连接失败时的重试次数（含首次请求）
+VOSK_RETRY_ATTEMPTS = max(1, int(os.environ.get("VOSK_RETRY_ATTEMPTS", 3)))
+VOSK_RETRY_STATUS_CODES = (429, 502, 503, 504)
+
+# 首次使用时在运行中的事件循环内创建（Python 3.9 的 Semaphore 创建时绑定事件循环）
+_vosk_semaphore: Optional[asyncio.Semaphore] = None
+
+
+def _get_vosk_semaphore() -> asyncio.Semaphore:
+    """获取限制远程服务并发的信号量"""
+    global _vosk_semaphore
+    if _vosk_semaphore is None:
+        _vosk_semaphore = asyncio.Semaphore(VOSK_MAX_CONCURRENCY)
+    return _vosk_semaphore
+
+# 去除单词中的非字母数字字符
+_NON_ALNUM_RE = re.compile(r'[\W_]+')
+
+# 评分结果磁盘缓存（需要安装 diskcache，未安装时不启用）
+SCORE_CACHE_DIR = os.environ.get(
+    "SCORE_CACHE_DIR", os.path.join(os.path.dirname(__file__), "score_cache")
+)
+SCORE_CACHE_SIZE_LIMIT = int(os.environ.get("SCORE_CACHE_SIZE_LIMIT", 1024 ** 3))
+
 
 @dataclass
 class PhonemeScore:
@@ -58,15 +97,91 @@ class VoskScorer:
         """
         self.service_url = VOSK_SERVICE_URL
         self.timeout = VOSK_TIMEOUT
+        self.cache = self._open_cache()
         logger.info(f"Vosk 评分器初始化，远程服务地址: {self.service_url}")
     
-    def score(self, audio_path: str, expected_text: str) -> Dict[str, Any]:
+    def _open_cache(self):
+        """
+        打开评分结果缓存（LFU 淘汰），相同音频 + 文本的重复评分直接返回缓存结果
+        """
+        if diskcache is None:
+            logger.info("未安装 diskcache，评分缓存未启用")
+            return None
+        
+        try:
+            cache = diskcache.FanoutCache(
+                SCORE_CACHE_DIR,
+                size_limit=SCORE_CACHE_SIZE_LIMIT,
+                eviction_policy='least-frequently-used',
+            )
+            cache.stats(enable=True)
+            logger.info(f"评分缓存已启用: {SCORE_CACHE_DIR}")
+            return cache
+        except Exception as e:
+            logger.warning(f"评分缓存初始化失败，不使用缓存: {e}")
+            return None
+    
+    def _cache_key(self, audio_file, expected_text: str) -> Optional[str]:
+        """
+        根据音频内容、期望文本和服务地址计算缓存键，读取后将文件指针复位
+        """
+        if self.cache is None:
+            return None
+        
+        digest = hashlib.blake2b(digest_size=16)
+        for chunk in iter(lambda: audio_file.read(1024 * 1024), b''):
+            digest.update(chunk)
+        audio_file.seek(0)
+        
+        digest.update(b'\0' + expected_text.encode('utf-8'))
+        digest.update(b'\0' + self.service_url.encode('utf-8'))
+        return digest.hexdigest()
+    
+    def _cache_get(self, key: Optional[str]) -> Optional[Dict[str, Any]]:
+        """读取缓存，缓存异常不影响评分"""
+        if key is None:
+            return None
+        try:
+            return self.cache.get(key)
+        except Exception as e:
+            logger.warning(f"读取评分缓存失败: {e}")
+            return None
+    
+    def _cache_set(self, key: Optional[str], result: Dict[str, Any]):
+        """写入缓存（只缓存远程服务的成功结果）"""
+        if key is None:
+            return
+        try:
+            self.cache.set(key, result)
+        except Exception as e:
+            logger.warning(f"写入评分缓存失败: {e}")
+    
+    def cache_stats(self) -> Optional[Dict[str, Any]]:
+        """
+        获取评分缓存命中统计
+        
+        Returns:
+            {"hits", "misses", "hitRatio"}，缓存未启用时返回 None
+        """
+        if self.cache is None:
+            return None
+        
+        hits, misses = self.cache.stats()
+        total = hits + misses
+        return {
+            "hits": hits,
+            "misses": misses,
+            "hitRatio": round(hits / total, 4) if total else 0.0
+        }
+    
+    def score(self, audio_path: str, expected_text: str, filename: Optional[str] = None) -> Dict[str, Any]:
         """
         对音频进行评分（调用远程 Vosk 服务）
         
         Args:
             audio_path: 音频文件路径
             expected_text: 期望的文本
+            filename: 上传给远程服务的文件名（默认取 audio_path 的文件名）
             
         Returns:
             评分结果字典
@@ -76,8 +191,14 @@ class VoskScorer:
         try:
             # 读取音频文件
             with open(audio_path, 'rb') as audio_file:
+                cache_key = self._cache_key(audio_file, expected_text)
+                cached = self._cache_get(cache_key)
+                if cached is not None:
+                    logger.info(f"评分命中缓存: overallScore={cached.get('overallScore')}")
+                    return cached
+                
                 files = {
-                    'audio': (os.path.basename(audio_path), audio_file, 'audio/mpeg')
+                    'audio': (filename or os.path.basename(audio_path), audio_file, 'audio/mpeg')
                 }
                 data = {
                     'text': expected_text
@@ -92,17 +213,19 @@ class VoskScorer:
                     )
                     
                     if response.status_code == 200:
-                        result = response.json()
+                        result = orjson.loads(response.content)
                         logger.info(f"评分成功: overallScore={result.get('overallScore')}")
                         
                         # 返回结果，保持与远程服务返回格式一致
-                        return {
+                        scored = {
                             "overallScore": result.get("overallScore", 0),
                             "phonemeScores": [],  # 兼容旧接口
                             "wordScores": result.get("wordScores", []),
                             "recognizedText": result.get("recognizedText", ""),
                             "feedback": result.get("feedback", "")
                         }
+                        self._cache_set(cache_key, scored)
+                        return scored
                     else:
                         logger.error(f"Vosk 服务返回错误: {response.status_code} - {response.text}")
                         return self._mock_score(expected_text, f"服务错误: {response.status_code}")
@@ -119,13 +242,14 @@ class VoskScorer:
             logger.error(f"评分失败: {e}")
             return self._mock_score(expected_text, f"评分失败: {str(e)}")
     
-    async def score_async(self, audio_path: str, expected_text: str) -> Dict[str, Any]:
+    async def score_async(self, audio_path: str, expected_text: str, filename: Optional[str] = None) -> Dict[str, Any]:
         """
         异步评分（调用远程 Vosk 服务）
         
         Args:
             audio_path: 音频文件路径
             expected_text: 期望的文本
+            filename: 上传给远程服务的文件名（默认取 audio_path 的文件名）
             
         Returns:
             评分结果字典
@@ -134,37 +258,37 @@ class VoskScorer:
         
         try:
             with open(audio_path, 'rb') as audio_file:
-                audio_content = audio_file.read()
-            
-            files = {
-                'audio': (os.path.basename(audio_path), audio_content, 'audio/mpeg')
-            }
-            data = {
-                'text': expected_text
-            }
-            
-            async with httpx.AsyncClient(timeout=self.timeout) as client:
-                response = await client.post(
-                    self.service_url,
-                    files=files,
-                    data=data
+                # 哈希整个音频和 diskcache 的 SQLite 读写都是阻塞操作，放到线程中执行，不占用事件循环
+                cache_key = cached = None
+                if self.cache is not None:
+                    cache_key = await asyncio.to_thread(self._cache_key, audio_file, expected_text)
+                    cached = await asyncio.to_thread(self._cache_get, cache_key)
+                if cached is not None:
+                    logger.info(f"评分命中缓存: overallScore={cached.get('overallScore')}")
+                    return cached
+                
+                response = await self._post_with_retry(
+                    filename or os.path.basename(audio_path), audio_file, expected_text
                 )
                 
                 if response.status_code == 200:
-                    result = response.json()
+                    result = orjson.loads(response.content)
                     logger.info(f"评分成功: overallScore={result.get('overallScore')}")
                     
-                    return {
+                    scored = {
                         "overallScore": result.get("overallScore", 0),
                         "phonemeScores": [],
                         "wordScores": result.get("wordScores", []),
                         "recognizedText": result.get("recognizedText", ""),
                         "feedback": result.get("feedback", "")
                     }
+                    if cache_key is not None:
+                        await asyncio.to_thread(self._cache_set, cache_key, scored)
+                    return scored
                 else:
                     logger.error(f"Vosk 服务返回错误: {response.status_code} - {response.text}")
                     return self._mock_score(expected_text, f"服务错误: {response.status_code}")
-                    
+                
         except httpx.TimeoutException:
             logger.error(f"Vosk 服务超时 ({self.timeout}s)")
             return self._mock_score(expected_text, "服务超时，请稍后重试")
@@ -177,6 +301,48 @@ class VoskScorer:
             logger.error(f"评分失败: {e}")
             return self._mock_score(expected_text, f"评分失败: {str(e)}")
     
+    async def _post_with_retry(self, upload_name: str, audio_file, expected_text: str) -> httpx.Response:
+        """
+        向远程服务提交评分请求，限制并发并在限流 / 网关错误 / 连接失败时指数退避重试
+        超时不重试（服务已在处理，重试只会加重负载）；重试耗尽后返回最后一次响应或抛出异常
+        """
+        # 复用进程内共享的连接池，避免每次评分都重新握手
+        client = get_http_client()
+        
+        for attempt in range(VOSK_RETRY_ATTEMPTS):
+            last_attempt = attempt == VOSK_RETRY_ATTEMPTS - 1
+            # 直接传入文件句柄，由 httpx 分块读取上传，避免整段音频先读入内存
+            audio_file.seek(0)
+            files = {
+                'audio': (upload_name, audio_file, 'audio/mpeg')
+            }
+            data = {
+                'text': expected_text
+            }
+            
+            try:
+                async with _get_vosk_semaphore():
+                    response = await client.post(
+                        self.service_url,
+                        files=files,
+                        data=data,
+                        timeout=self.timeout
+                    )
+            except httpx.TimeoutException:
+                raise
+            except httpx.RequestError as e:
+                if last_attempt:
+                    raise
+                logger.warning(f"Vosk 服务请求失败，准备重试 ({attempt + 1}/{VOSK_RETRY_ATTEMPTS}): {e}")
+            else:
+                if response.status_code not in VOSK_RETRY_STATUS_CODES or last_attempt:
+                    return response
+                logger.warning(
+                    f"Vosk 服务返回 {response.status_code}，准备重试 ({attempt + 1}/{VOSK_RETRY_ATTEMPTS})"
+                )
+            
+            await asyncio.sleep(min(30, 0.5 * 2 ** attempt + random.random()))
+    
     def _mock_score(self, expected_text: str, error_message: str) -> Dict[str, Any]:
         """
         生成模拟评分结果（当远程服务不可用时）
@@ -188,26 +354,23 @@ class VoskScorer:
         Returns:
             模拟的评分结果
         """
-        words = expected_text.split()
-        word_scores = []
-        
-        for word in words:
-            clean_word = ''.join(c for c in word if c.isalnum())
-            phoneme_scores = []
-            for k, char in enumerate(clean_word):
-                if char.isalpha():
-                    phoneme_scores.append({
+        word_scores = [
+            {
+                "word": word,
+                "score": 0,
+                "phonemes": [
+                    {
                         "phoneme": char,
                         "score": 0,
                         "startTime": k * 0.1,
                         "endTime": (k + 1) * 0.1
-                    })
-            
-            word_scores.append({
-                "word": word,
-                "score": 0,
-                "phonemes": phoneme_scores
-            })
+                    }
+                    for k, char in enumerate(_NON_ALNUM_RE.sub('', word))
+                    if char.isalpha()
+                ]
+            }
+            for word in expected_text.split()
+        ]
         
         return {
             "overallScore": 0,
@@ -5,40 +5,88 @@
 
 import asyncio
 import random
+import time
 import logging
 import os
 import subprocess
+import glob
 import tempfile
 import hashlib
 import shutil
+import threading
+import urllib.request
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
 from datetime import datetime
-from typing import Optional
+from functools import lru_cache
+from typing import Any, NamedTuple, Optional
+from collections import OrderedDict
 from pathlib import Path
 
-import httpx
+import aiofiles
+import orjson
 from sqlalchemy.orm import Session
 
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+
 from database import (
     get_db_session, Season, RecommendedClip,
-    clear_recommended_clips, add_recommended_clip, get_recommended_clips,
-    VocalRemovalTask, get_pending_vocal_removal_tasks, update_vocal_removal_task,
+    replace_recommended_clips, get_recommended_clips,
+    VocalRemovalTask, claim_pending_vocal_removal_tasks, update_vocal_removal_task,
     cleanup_failed_vocal_removal_tasks,
-    MediaCache, get_media_cache, create_media_cache, get_media_cache_by_url_and_type,
-    UserDubbing, get_pending_user_dubbings, update_user_dubbing, cleanup_failed_user_dubbings
+    MediaCache, get_media_cache, bulk_create_media_cache, get_media_cache_by_url_and_type,
+    UserDubbing, claim_pending_user_dubbings, update_user_dubbing, cleanup_failed_user_dubbings,
+    TASK_PROCESSING_TIMEOUT, touch_processing_task
 )
+from http_client import get_http_client, get_base_url
+from notify import WORKER_NOTIFY_ADDR, parse_notify_addr, task_notifiers
 
 logger = logging.getLogger(__name__)
 
 # Worker 配置
 RECOMMENDATION_INTERVAL_SECONDS = 60 * 60  # 1小时
 RECOMMENDATION_COUNT = 20  # 生成20个推荐
-VOCAL_REMOVAL_CHECK_INTERVAL = 1  # 每1秒检查一次人声去除任务
-COMPOSITE_VIDEO_CHECK_INTERVAL = 1  # 每1秒检查一次视频合成任务
+EPISODE_FETCH_CONCURRENCY = 16  # 生成推荐时并发获取单集 JSON 的上限
+JSON_CACHE_MAX_ENTRIES = 2048  # 远程 JSON 缓存条目上限（LRU 淘汰）
+JSON_CACHE_TTL_SECONDS = 5 * 60  # 缓存有效期内不发请求，过期后用 ETag/Last-Modified 条件请求校验
+VOCAL_REMOVAL_CHECK_INTERVAL = float(os.environ.get("VOCAL_REMOVAL_CHECK_INTERVAL", 1))  # 每1秒检查一次人声去除任务
+COMPOSITE_VIDEO_CHECK_INTERVAL = float(os.environ.get("COMPOSITE_VIDEO_CHECK_INTERVAL", 1))  # 每1秒检查一次视频合成任务
+# 收到过 API 的 UDP 通知（说明通知可达）后，轮询只作兜底，间隔放宽到该值（秒）
+NOTIFIED_CHECK_INTERVAL = float(os.environ.get("WORKER_NOTIFIED_CHECK_INTERVAL", 60))
+VOCAL_CONCURRENCY = int(os.environ.get("VOCAL_CONCURRENCY", 2))  # 同时处理的人声去除任务数
+COMPOSITE_CONCURRENCY = int(os.environ.get("COMPOSITE_CONCURRENCY", 2))  # 同时处理的视频合成任务数
 
 # 人声去除相关配置
 VOCAL_REMOVAL_OUTPUT_DIR = os.path.join(os.path.dirname(__file__), "vocal_removed")
 os.makedirs(VOCAL_REMOVAL_OUTPUT_DIR, exist_ok=True)
 
+DOWNLOAD_CHUNK_SIZE = 1024 * 1024  # 下载视频时每次写入的块大小
+
+# ffmpeg 公共参数：不打印版本横幅和进度信息，只输出错误；不读取标准输入
+FFMPEG_BASE_ARGS = ('ffmpeg', '-hide_banner', '-loglevel', 'error', '-nostdin', '-y')
+
+# 缓存背景音的编码：codec -> (扩展名, ffmpeg 音频参数)
+# flac 无损（约 5 MB/分钟，为 WAV 的一半）；opus / aac 为有损，体积约为 WAV 的 1/10，合成时会再做一次有损编码
+BACKGROUND_AUDIO_FORMATS = {
+    'flac': ('.flac', ('-c:a', 'flac')),
+    'opus': ('.opus', ('-c:a', 'libopus', '-b:a', '96k')),
+    'aac': ('.m4a', ('-c:a', 'aac', '-b:a', '128k')),
+}
+BACKGROUND_AUDIO_CODEC = os.environ.get("BACKGROUND_AUDIO_CODEC", "flac").lower()
+if BACKGROUND_AUDIO_CODEC not in BACKGROUND_AUDIO_FORMATS:
+    logger.warning(f"不支持的 BACKGROUND_AUDIO_CODEC: {BACKGROUND_AUDIO_CODEC}，使用 flac")
+    BACKGROUND_AUDIO_CODEC = 'flac'
+
+# Demucs 模型配置（进程内加载一次，后续任务复用）
+DEMUCS_MODEL_NAME = os.environ.get("DEMUCS_MODEL", "htdemucs")
+# 推理精度: auto（GPU 上 fp16 自动混合精度，CPU 上 fp32）/ fp32 / fp16 / int8（CPU 动态量化，需自行验证分离质量）
+DEMUCS_PRECISION = os.environ.get("DEMUCS_PRECISION", "auto").lower()
+# Demucs 子进程数量，每个子进程各自加载一份模型（按 GPU 数 / 显存决定，默认 1）
+DEMUCS_WORKERS = max(1, int(os.environ.get("DEMUCS_WORKERS", 1)))
+
 # 媒体缓存相关配置
 MEDIA_CACHE_DIR = os.path.join(os.path.dirname(__file__), "media_cache")
 BACKGROUND_CACHE_DIR = os.path.join(MEDIA_CACHE_DIR, "background")
@@ -46,17 +94,180 @@ MUTE_VIDEO_CACHE_DIR = os.path.join(MEDIA_CACHE_DIR, "mute_video")
 USER_AUDIO_DIR = os.path.join(os.path.dirname(__file__), "user_audio")
 USER_VIDEOS_DIR = os.path.join(os.path.dirname(__file__), "user_videos")
 USER_DUBBINGS_DIR = os.path.join(os.path.dirname(__file__), "user_dubbings")
+JSON_CACHE_FILE = os.path.join(MEDIA_CACHE_DIR, "json_cache.json")  # 远程 JSON 缓存文件
 os.makedirs(BACKGROUND_CACHE_DIR, exist_ok=True)
 os.makedirs(MUTE_VIDEO_CACHE_DIR, exist_ok=True)
 os.makedirs(USER_VIDEOS_DIR, exist_ok=True)
 os.makedirs(USER_DUBBINGS_DIR, exist_ok=True)
 
 
-def get_base_url(all_json_url: str) -> str:
-    """从 all.json URL 获取基础 URL"""
-    if all_json_url.endswith('/all.json'):
-        return all_json_url[:-8]
-    return all_json_url.rsplit('/', 1)[0] + '/'
+# 远程 JSON 缓存: url -> (etag, last_modified, body, expires_at)
+# 持久化到磁盘，Worker 重启后仍可用 ETag / Last-Modified 做条件请求
+_json_cache: "OrderedDict[str, tuple]" = OrderedDict()
+_json_cache_loaded = False
+
+
+def load_json_cache():
+    """从磁盘加载 JSON 缓存（只加载一次）；加载的条目视为已过期，首次使用时会做条件请求校验"""
+    global _json_cache_loaded
+    
+    if _json_cache_loaded:
+        return
+    _json_cache_loaded = True
+    
+    if not os.path.exists(JSON_CACHE_FILE):
+        return
+    try:
+        with open(JSON_CACHE_FILE, 'rb') as f:
+            entries = orjson.loads(f.read())
+        for url, entry in entries.items():
+            _json_cache[url] = (entry.get("etag"), entry.get("last_modified"), entry.get("body"), 0)
+        logger.info(f"已加载 {len(entries)} 条远程 JSON 缓存")
+    except Exception as e:
+        logger.warning(f"加载远程 JSON 缓存失败: {e}")
+
+
+def save_json_cache():
+    """将 JSON 缓存写入磁盘（先写临时文件再替换，避免写入中断损坏缓存）"""
+    entries = {
+        url: {"etag": etag, "last_modified": last_modified, "body": body}
+        for url, (etag, last_modified, body, _) in _json_cache.items()
+    }
+    tmp_path = f"{JSON_CACHE_FILE}.tmp"
+    try:
+        with open(tmp_path, 'wb') as f:
+            f.write(orjson.dumps(entries))
+        os.replace(tmp_path, JSON_CACHE_FILE)
+    except Exception as e:
+        logger.warning(f"保存远程 JSON 缓存失败: {e}")
+
+# 已提示过未启用压缩的源站（每个 host 只提示一次）
+_uncompressed_hosts: set = set()
+
+
+def check_response_compression(response):
+    """检查源站是否返回压缩内容，未压缩时提示开启 gzip / brotli"""
+    host = response.url.host
+    if host in _uncompressed_hosts or response.headers.get("content-encoding"):
+        return
+    _uncompressed_hosts.add(host)
+    logger.warning(f"源站 {host} 返回的 JSON 未压缩，建议开启 gzip 或 brotli 以减少传输量")
+
+
+async def cached_json(client, url: str, timeout: float = 30.0) -> Any:
+    """
+    获取远程 JSON，带内存缓存
+    有效期内直接返回缓存；过期后发送 If-None-Match / If-Modified-Since，
+    服务器返回 304 时复用缓存内容
+    """
+    load_json_cache()
+    
+    cached = _json_cache.get(url)
+    if cached is not None:
+        _json_cache.move_to_end(url)
+        etag, last_modified, body, expires_at = cached
+        if time.monotonic() < expires_at:
+            return body
+    
+    headers = {}
+    if cached is not None:
+        if etag:
+            headers["If-None-Match"] = etag
+        if last_modified:
+            headers["If-Modified-Since"] = last_modified
+    
+    response = await client.get(url, headers=headers, timeout=timeout)
+    if response.status_code == 304 and cached is not None:
+        body = cached[2]
+    else:
+        response.raise_for_status()
+        check_response_compression(response)
+        body = orjson.loads(response.content)
+    
+    _json_cache[url] = (
+        response.headers.get("etag") or (cached[0] if cached else None),
+        response.headers.get("last-modified") or (cached[1] if cached else None),
+        body,
+        time.monotonic() + JSON_CACHE_TTL_SECONDS
+    )
+    _json_cache.move_to_end(url)
+    while len(_json_cache) > JSON_CACHE_MAX_ENTRIES:
+        _json_cache.popitem(last=False)
+    
+    return body
+
+
+class ClipRow(NamedTuple):
+    """可推荐的片段（生成推荐时的候选项，字段与 RecommendedClip 对应）"""
+    season_id: str
+    episode_name: str
+    clip_path: str
+    video_url: str
+    thumbnail: Optional[str]
+    original_text: str
+    translation_cn: Optional[str]
+    duration: float
+
+
+async def fetch_episode_clips(client, base_url: str, episode_name: str,
+                              season_id: str, semaphore: asyncio.Semaphore) -> list:
+    """
+    获取单集 JSON 并转换为推荐片段数据
+    失败时返回空列表，不影响其他集
+    """
+    episode_json_url = f"{base_url}{episode_name}/{episode_name}.json"
+    try:
+        async with semaphore:
+            episode_data = await cached_json(client, episode_json_url)
+    except Exception as e:
+        logger.debug(f"获取集 {episode_name} 失败: {e}")
+        return []
+    
+    # 收集该集的所有片段
+    clips = []
+    for clip in episode_data.get("clips", []):
+        clip_path = f"{episode_name}/{clip.get('video_url', '')}"
+        video_url = f"{base_url}{clip_path}"
+        
+        thumbnail = clip.get("thumbnail")
+        if thumbnail:
+            thumbnail = f"{base_url}{episode_name}/{thumbnail}"
+        
+        clips.append(ClipRow(
+            season_id=season_id,
+            episode_name=episode_name,
+            clip_path=clip_path,
+            video_url=video_url,
+            thumbnail=thumbnail,
+            original_text=clip.get("original_text", ""),
+            translation_cn=clip.get("translation_cn"),
+            duration=clip.get("duration", 0)
+        ))
+    return clips
+
+
+async def fetch_season_clips(client, season_id: str, all_json_url: str,
+                             semaphore: asyncio.Semaphore) -> list:
+    """
+    获取一季的 all.json，并发获取每一集的片段
+    失败时返回空列表，不影响其他季
+    """
+    try:
+        # 获取 all.json
+        base_url = get_base_url(all_json_url)
+        async with semaphore:
+            episodes = await cached_json(client, all_json_url)
+    except Exception as e:
+        logger.debug(f"处理季 {season_id} 失败: {e}")
+        return []
+    
+    # 并发获取每一集的片段
+    results = await asyncio.gather(*(
+        fetch_episode_clips(client, base_url, episode.get("name", ""), season_id, semaphore)
+        for episode in episodes
+        if episode.get("name", "")
+    ))
+    return [clip for clips in results for clip in clips]
 
 
 async def generate_recommendations_task(count: int = RECOMMENDATION_COUNT) -> dict:
@@ -77,57 +288,21 @@ async def generate_recommendations_task(count: int = RECOMMENDATION_COUNT) -> di
         # 收集所有可用的片段
         all_clips = []
         
-        async with httpx.AsyncClient(timeout=30.0) as client:
-            for season in seasons:
-                if not season.all_json_url:
-                    continue
-                
-                try:
-                    # 获取 all.json
-                    base_url = get_base_url(season.all_json_url)
-                    response = await client.get(season.all_json_url)
-                    response.raise_for_status()
-                    episodes = response.json()
-                    
-                    # 遍历每一集
-                    for episode in episodes:
-                        episode_name = episode.get("name", "")
-                        if not episode_name:
-                            continue
-                        
-                        # 获取单集 JSON
-                        episode_json_url = f"{base_url}{episode_name}/{episode_name}.json"
-                        try:
-                            ep_response = await client.get(episode_json_url)
-                            ep_response.raise_for_status()
-                            episode_data = ep_response.json()
-                            
-                            # 收集该集的所有片段
-                            for clip in episode_data.get("clips", []):
-                                clip_path = f"{episode_name}/{clip.get('video_url', '')}"
-                                video_url = f"{base_url}{clip_path}"
-                                
-                                thumbnail = clip.get("thumbnail")
-                                if thumbnail:
-                                    thumbnail = f"{base_url}{episode_name}/{thumbnail}"
-                                
-                                all_clips.append({
-                                    "season_id": season.id,
-                                    "episode_name": episode_name,
-                                    "clip_path": clip_path,
-                                    "video_url": video_url,
-                                    "thumbnail": thumbnail,
-                                    "original_text": clip.get("original_text", ""),
-                                    "translation_cn": clip.get("translation_cn"),
-                                    "duration": clip.get("duration", 0)
-                                })
-                        except Exception as e:
-                            logger.debug(f"获取集 {episode_name} 失败: {e}")
-                            continue
-                            
-                except Exception as e:
-                    logger.debug(f"处理季 {season.id} 失败: {e}")
-                    continue
+        client = get_http_client()
+        # 全局并发上限，所有季的 all.json 和单集请求共享，避免压垮源站
+        semaphore = asyncio.Semaphore(EPISODE_FETCH_CONCURRENCY)
+        
+        # 所有季并发获取
+        results = await asyncio.gather(*(
+            fetch_season_clips(client, season.id, season.all_json_url, semaphore)
+            for season in seasons
+            if season.all_json_url
+        ))
+        for clips in results:
+            all_clips.extend(clips)
+        
+        # 本次获取结果写回磁盘缓存
+        await asyncio.to_thread(save_json_cache)
         
         if not all_clips:
             logger.warning("没有找到可用的片段，跳过生成推荐")
@@ -136,12 +311,9 @@ async def generate_recommendations_task(count: int = RECOMMENDATION_COUNT) -> di
         # 随机选择指定数量的片段
         selected_clips = random.sample(all_clips, min(count, len(all_clips)))
         
-        # 清空现有推荐，添加新的
-        clear_recommended_clips(db)
-        
-        for i, clip_data in enumerate(selected_clips):
-            clip_data["sort_order"] = i
-            add_recommended_clip(db, clip_data)
+        # 清空现有推荐并批量写入新的（同一事务）
+        rows = [{**clip._asdict(), "sort_order": i} for i, clip in enumerate(selected_clips)]
+        replace_recommended_clips(db, rows)
         
         logger.info(f"成功生成 {len(selected_clips)} 个推荐片段 (总可用: {len(all_clips)})")
         return {
@@ -197,51 +369,262 @@ async def recommendation_worker():
 
 # ===== 人声去除功能 =====
 
+@lru_cache(maxsize=4096)
 def get_url_hash(url: str) -> str:
-    """生成 URL 的哈希值作为文件名"""
-    return hashlib.md5(url.encode()).hexdigest()[:16]
+    """生成 URL 的哈希值作为文件名（16 位十六进制）"""
+    return hashlib.blake2b(url.encode(), digest_size=8).hexdigest()
+
+
+def _urllib_download(url: str, output_path: str):
+    """使用 urllib 在当前线程中流式下载文件（大文件比 httpx 读取 body 更快）"""
+    with urllib.request.urlopen(url, timeout=300) as response, open(output_path, 'wb') as f:
+        shutil.copyfileobj(response, f, length=DOWNLOAD_CHUNK_SIZE)
 
 
 async def download_video(url: str, output_path: str) -> bool:
-    """下载视频文件"""
+    """
+    下载视频文件
+    先用 HEAD 解析重定向得到最终地址，再在线程中用 urllib 直接下载；
+    失败时（如源站不支持 HEAD）回退到 httpx 流式下载
+    """
+    client = get_http_client()
+    
+    try:
+        head = await client.head(url, timeout=30.0, follow_redirects=True)
+        head.raise_for_status()
+        await asyncio.to_thread(_urllib_download, str(head.url), output_path)
+        logger.info(f"视频下载完成: {output_path}")
+        return True
+    except Exception as e:
+        logger.warning(f"直接下载失败，改用 httpx 流式下载: {e}")
+    
     try:
-        async with httpx.AsyncClient(timeout=300.0, follow_redirects=True) as client:
-            response = await client.get(url)
+        # 流式下载，分块写入磁盘，内存占用与视频大小无关
+        async with client.stream("GET", url, timeout=300.0, follow_redirects=True) as response:
             response.raise_for_status()
-            with open(output_path, 'wb') as f:
-                f.write(response.content)
-            logger.info(f"视频下载完成: {output_path}")
-            return True
+            async with aiofiles.open(output_path, 'wb') as f:
+                async for chunk in response.aiter_bytes(DOWNLOAD_CHUNK_SIZE):
+                    await f.write(chunk)
+        logger.info(f"视频下载完成: {output_path}")
+        return True
     except Exception as e:
         logger.error(f"下载视频失败: {e}")
         return False
 
 
-def extract_audio(video_path: str, audio_path: str) -> bool:
-    """从视频中提取音频为 MP3"""
+async def run_command(cmd: list) -> subprocess.CompletedProcess:
+    """
+    异步执行外部命令（ffmpeg 等），等待期间不阻塞事件循环
+    stdout 直接丢弃，只收集 stderr；stderr 仅在命令失败时才解码
+    """
+    proc = await asyncio.create_subprocess_exec(
+        *cmd,
+        stdin=asyncio.subprocess.DEVNULL,
+        stdout=asyncio.subprocess.DEVNULL,
+        stderr=asyncio.subprocess.PIPE
+    )
     try:
-        cmd = [
-            'ffmpeg', '-y', '-i', video_path,
-            '-vn',  # 不处理视频
-            '-acodec', 'libmp3lame',
-            '-q:a', '2',  # 高质量
-            audio_path
-        ]
-        result = subprocess.run(cmd, capture_output=True, text=True)
-        if result.returncode != 0:
-            logger.error(f"提取音频失败: {result.stderr}")
-            return False
-        logger.info(f"音频提取完成: {audio_path}")
-        return True
-    except Exception as e:
-        logger.error(f"提取音频异常: {e}")
-        return False
+        _, stderr = await proc.communicate()
+    except asyncio.CancelledError:
+        # 任务被取消时结束子进程，避免遗留 ffmpeg 进程
+        proc.kill()
+        await proc.wait()
+        raise
+    return subprocess.CompletedProcess(
+        cmd, proc.returncode,
+        None,
+        stderr.decode(errors='replace') if proc.returncode != 0 else ''
+    )
+
+
+# Linux FICLONE ioctl（btrfs / XFS 等支持 reflink 的文件系统上 O(1) 写时复制克隆）
+FICLONE = 0x40049409
+
+
+def copy_media_file(src: str, dst: str):
+    """
+    复制媒体文件：优先 reflink 克隆，不支持时退回 shutil.copyfile
+    （shutil.copyfile 在 Linux 上使用 os.sendfile 内核态复制，macOS 上使用 fcopyfile）
+    """
+    if fcntl is not None:
+        try:
+            with open(src, 'rb') as fsrc, open(dst, 'wb') as fdst:
+                fcntl.ioctl(fdst.fileno(), FICLONE, fsrc.fileno())
+            return
+        except OSError:
+            # 跨文件系统 / 文件系统不支持 reflink，下面重新完整复制
+            pass
+    
+    shutil.copyfile(src, dst)
+
+
+# 进程内 Demucs 模型（懒加载），加载失败时回退到命令行方式
+_demucs_model = None
+_demucs_device = None
+_demucs_use_fp16 = False
+_demucs_available = True
+_demucs_lock = threading.Lock()
+
+
+def get_demucs_model():
+    """
+    获取进程内的 Demucs 模型，首次调用时加载并常驻内存（GPU 可用时放到 GPU）
+    返回 (model, device)；demucs / torch 不可用时返回 (None, None)
+    """
+    global _demucs_model, _demucs_device, _demucs_use_fp16, _demucs_available
+    
+    if _demucs_model is not None or not _demucs_available:
+        return _demucs_model, _demucs_device
+    
+    with _demucs_lock:
+        if _demucs_model is None and _demucs_available:
+            try:
+                import torch
+                from demucs.pretrained import get_model
+                
+                device = 'cuda' if torch.cuda.is_available() else 'cpu'
+                model = get_model(DEMUCS_MODEL_NAME)
+                model.eval()
+                
+                if DEMUCS_PRECISION == 'int8' and device == 'cpu':
+                    # CPU 上对 Linear / LSTM 做 int8 动态量化
+                    model = torch.quantization.quantize_dynamic(
+                        model, {torch.nn.Linear, torch.nn.LSTM}, dtype=torch.qint8
+                    )
+                model.to(device)
+                
+                _demucs_use_fp16 = device == 'cuda' and DEMUCS_PRECISION in ('auto', 'fp16')
+                _demucs_model, _demucs_device = model, device
+                logger.info(
+                    f"Demucs 模型已加载: {DEMUCS_MODEL_NAME} ({device}, "
+                    f"precision={'fp16' if _demucs_use_fp16 else DEMUCS_PRECISION})"
+                )
+            except Exception as e:
+                _demucs_available = False
+                logger.warning(f"进程内加载 Demucs 失败，改用命令行方式: {e}")
+    
+    return _demucs_model, _demucs_device
+
+
+def _remove_vocals_in_process(model, device: str, audio_path: str, output_dir: str) -> Optional[str]:
+    """
+    使用已加载的 Demucs 模型分离人声
+    处理流程与 `python -m demucs --two-stems vocals` 一致，输出路径结构也相同
+    """
+    import torch
+    from demucs.apply import apply_model
+    from demucs.audio import AudioFile, save_audio
+    
+    wav = AudioFile(audio_path).read(
+        streams=0, samplerate=model.samplerate, channels=model.audio_channels
+    )
+    ref = wav.mean(0)
+    mean, std = ref.mean(), ref.std()
+    wav = (wav - mean) / std
+    
+    # inference_mode 关闭 autograd 记录；GPU 上使用 fp16 自动混合精度
+    with torch.inference_mode(), torch.autocast(device_type=device, dtype=torch.float16, enabled=_demucs_use_fp16):
+        sources = apply_model(model, wav[None], device=device, split=True, overlap=0.25, progress=False)[0]
+    sources = sources.float() * std + mean
+    
+    # no_vocals = 除人声外所有音轨之和
+    vocals_index = model.sources.index('vocals')
+    no_vocals = sources.sum(0) - sources[vocals_index]
+    
+    track_dir = os.path.join(output_dir, DEMUCS_MODEL_NAME, Path(audio_path).stem)
+    os.makedirs(track_dir, exist_ok=True)
+    no_vocals_path = os.path.join(track_dir, 'no_vocals.wav')
+    save_audio(no_vocals.cpu(), no_vocals_path, samplerate=model.samplerate, clip='rescale')
+    
+    logger.info(f"人声分离完成: {no_vocals_path}")
+    return no_vocals_path
+
+
+# Demucs 专用进程池：分离在子进程中执行，不阻塞事件循环，模型常驻在子进程内
+# 同时进行的分离数量受 DEMUCS_WORKERS 限制，并发任务多时排队，避免显存耗尽
+_demucs_pool: Optional[ProcessPoolExecutor] = None
+
+
+def get_demucs_pool() -> ProcessPoolExecutor:
+    """获取 Demucs 进程池（首次调用时创建，使用 spawn 避免 fork 带入 CUDA/事件循环状态）"""
+    global _demucs_pool
+    
+    if _demucs_pool is None:
+        _demucs_pool = ProcessPoolExecutor(
+            max_workers=DEMUCS_WORKERS,
+            mp_context=multiprocessing.get_context('spawn'),
+            initializer=_init_demucs_process
+        )
+        logger.info(f"Demucs 进程池已创建，子进程数: {DEMUCS_WORKERS}")
+    return _demucs_pool
+
+
+def _init_demucs_process():
+    """Demucs 子进程启动时预先加载模型，之后的任务直接复用"""
+    get_demucs_model()
+
+
+def _is_demucs_model_loaded() -> bool:
+    """在 Demucs 子进程中执行：模型是否已加载（用于预热）"""
+    return _demucs_model is not None
+
+
+def _log_demucs_warm_up(future):
+    """预热任务完成回调；进程池关闭时被取消的预热任务不记录"""
+    if future.cancelled():
+        return
+    if future.exception() is None and future.result():
+        logger.info("Demucs 子进程预热完成，模型已加载")
+    else:
+        logger.info("Demucs 子进程预热完成，模型未加载（将使用命令行方式）")
+
+
+def warm_up_demucs_pool():
+    """
+    提前启动 Demucs 子进程并加载模型（Worker 启动时调用）
+    进程池按需创建子进程，每个子进程提交一个空任务即可触发启动，避免首个任务承担模型加载耗时
+    """
+    pool = get_demucs_pool()
+    for _ in range(DEMUCS_WORKERS):
+        pool.submit(_is_demucs_model_loaded).add_done_callback(_log_demucs_warm_up)
+
+
+def shutdown_demucs_pool():
+    """关闭 Demucs 进程池"""
+    global _demucs_pool
+    
+    if _demucs_pool is not None:
+        _demucs_pool.shutdown(wait=False, cancel_futures=True)
+        _demucs_pool = None
+        logger.info("Demucs 进程池已关闭")
+
+
+async def run_demucs(audio_path: str, output_dir: str) -> Optional[str]:
+    """在 Demucs 进程池中分离人声"""
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(get_demucs_pool(), remove_vocals_with_demucs, audio_path, output_dir)
 
 
 def remove_vocals_with_demucs(audio_path: str, output_dir: str) -> Optional[str]:
     """
     使用 Demucs 分离人声
     返回没有人声的音频路径（accompaniment = bass + drums + other）
+    优先使用进程内常驻模型，避免每次任务都重新加载模型；耗时较长，应通过 run_demucs 在进程池中执行
+    """
+    model, device = get_demucs_model()
+    if model is not None:
+        try:
+            return _remove_vocals_in_process(model, device, audio_path, output_dir)
+        except Exception as e:
+            logger.error(f"Demucs 分离异常: {e}")
+            return None
+    
+    return _remove_vocals_with_demucs_cli(audio_path, output_dir)
+
+
+def _remove_vocals_with_demucs_cli(audio_path: str, output_dir: str) -> Optional[str]:
+    """
+    通过命令行调用 Demucs 分离人声（进程内模型不可用时使用）
     """
     try:
         # 使用 demucs 分离音频
@@ -259,49 +642,41 @@ def remove_vocals_with_demucs(audio_path: str, output_dir: str) -> Optional[str]
             logger.error(f"Demucs 分离失败: {result.stderr}")
             return None
         
-        # Demucs 输出结构: output_dir/htdemucs/{filename_without_ext}/no_vocals.wav
+        # Demucs 输出结构: output_dir/{model}/{filename_without_ext}/no_vocals.wav
         audio_basename = Path(audio_path).stem
-        # 尝试多个可能的模型名称
-        possible_models = ['htdemucs', 'htdemucs_ft', 'mdx_extra', 'demucs']
-        
-        no_vocals_path = None
-        for model in possible_models:
-            candidate = os.path.join(output_dir, model, audio_basename, 'no_vocals.wav')
-            if os.path.exists(candidate):
-                no_vocals_path = candidate
-                break
-        
-        if no_vocals_path and os.path.exists(no_vocals_path):
-            logger.info(f"人声分离完成: {no_vocals_path}")
-            return no_vocals_path
-        else:
-            # 列出输出目录内容以便调试
-            logger.error(f"未找到分离后的音频文件，输出目录: {output_dir}")
-            for root, dirs, files in os.walk(output_dir):
-                for f in files:
-                    logger.info(f"  发现文件: {os.path.join(root, f)}")
-            return None
+        matches = glob.glob(os.path.join(output_dir, '*', glob.escape(audio_basename), 'no_vocals.wav'))
+        
+        if matches:
+            logger.info(f"人声分离完成: {matches[0]}")
+            return matches[0]
+        
+        logger.error(f"未找到分离后的音频文件，输出目录: {output_dir}")
+        return None
             
     except Exception as e:
         logger.error(f"Demucs 分离异常: {e}")
         return None
 
 
-def merge_audio_to_video(video_path: str, audio_path: str, output_path: str) -> bool:
-    """将新的音频合成到视频中"""
+async def merge_audio_to_video(video_path: str, audio_path: str, output_path: str) -> bool:
+    """
+    将新的音频合成到视频中
+    视频流直接复制；音频已是 AAC（如混音结果）时也直接复制，否则（如 FLAC 背景音）编码一次为 AAC
+    """
+    audio_codec = 'copy' if Path(audio_path).suffix.lower() in ('.aac', '.m4a') else 'aac'
     try:
         cmd = [
-            'ffmpeg', '-y',
+            *FFMPEG_BASE_ARGS,
             '-i', video_path,  # 输入视频
             '-i', audio_path,  # 输入音频
             '-c:v', 'copy',  # 复制视频流
-            '-c:a', 'aac',  # 音频编码为 AAC
+            '-c:a', audio_codec,
             '-map', '0:v:0',  # 使用第一个输入的视频流
             '-map', '1:a:0',  # 使用第二个输入的音频流
             '-shortest',  # 以最短的流为准
             output_path
         ]
-        result = subprocess.run(cmd, capture_output=True, text=True)
+        result = await run_command(cmd)
         if result.returncode != 0:
             logger.error(f"合成视频失败: {result.stderr}")
             return False
@@ -317,72 +692,62 @@ async def process_vocal_removal_task(task: VocalRemovalTask) -> dict:
     处理单个人声去除任务
     
     流程：
-    1. 下载视频
-    2. 提取音频为 MP3
-    3. 使用 Demucs 分离出无人声版本
-    4. 将无人声音频合成到视频
-    5. 返回处理后的视频路径
+    1. 获取背景音和无声视频（与视频合成共用媒体缓存；未命中时下载视频并用 Demucs 分离，顺带写入缓存）
+    2. 将背景音合成到无声视频（单次 ffmpeg，视频流直接复制）
+    3. 返回处理后的视频路径
     """
     db = get_db_session()
     
     try:
-        # 更新状态为处理中
-        update_vocal_removal_task(db, task.id, status="processing")
-        
-        # 创建临时工作目录
         url_hash = get_url_hash(task.video_url)
-        work_dir = tempfile.mkdtemp(prefix=f"vocal_removal_{url_hash}_")
+        video_ext = Path(task.video_url).suffix or '.mp4'
+        output_filename = f"{url_hash}_no_vocals{video_ext}"
+        output_video_path = os.path.join(VOCAL_REMOVAL_OUTPUT_DIR, output_filename)
+        relative_path = f"/vocal_removed/{output_filename}"
+        
+        # 同一视频之前已处理过（如失败任务被删除后重新提交），直接复用已有结果
+        if os.path.exists(output_video_path):
+            update_vocal_removal_task(
+                db, task.id,
+                status="completed",
+                output_video_path=relative_path
+            )
+            logger.info(f"复用已有的无人声视频: {task.video_url} -> {relative_path}")
+            return {"success": True, "output_path": relative_path}
         
+        # 1. 获取背景音和无声视频（缓存命中时无需下载和人声分离）
+        logger.info(f"获取背景音和无声视频: {task.video_url}")
+        bg_audio_path, mute_video_path = await get_or_create_background_and_mute_video(task.video_url)
+        if not bg_audio_path or not mute_video_path:
+            raise Exception("获取背景音和无声视频失败")
+        
+        # 2. 合成新视频（先写临时文件再原子替换，避免中断时留下不完整的结果被当作缓存）
+        partial_video_path = os.path.join(VOCAL_REMOVAL_OUTPUT_DIR, f"{url_hash}_no_vocals.partial{video_ext}")
+        
+        logger.info(f"开始合成无人声视频...")
+        if not await merge_audio_to_video(mute_video_path, bg_audio_path, partial_video_path):
+            raise Exception("合成视频失败")
+        os.replace(partial_video_path, output_video_path)
+        
+        # 3. 更新任务状态为完成
+        # 返回相对路径，便于构建 URL
+        # 状态写入失败时删除结果文件，避免没有任务记录的文件被上面的复用分支当作已完成结果
         try:
-            # 1. 下载视频
-            video_ext = Path(task.video_url).suffix or '.mp4'
-            downloaded_video = os.path.join(work_dir, f"original{video_ext}")
-            
-            logger.info(f"开始下载视频: {task.video_url}")
-            if not await download_video(task.video_url, downloaded_video):
-                raise Exception("下载视频失败")
-            
-            # 2. 提取音频
-            audio_path = os.path.join(work_dir, "audio.mp3")
-            logger.info(f"开始提取音频...")
-            if not extract_audio(downloaded_video, audio_path):
-                raise Exception("提取音频失败")
-            
-            # 3. 使用 Demucs 分离人声
-            demucs_output_dir = os.path.join(work_dir, "demucs_output")
-            os.makedirs(demucs_output_dir, exist_ok=True)
-            
-            logger.info(f"开始分离人声...")
-            no_vocals_path = remove_vocals_with_demucs(audio_path, demucs_output_dir)
-            if not no_vocals_path:
-                raise Exception("人声分离失败")
-            
-            # 4. 合成新视频
-            output_filename = f"{url_hash}_no_vocals{video_ext}"
-            output_video_path = os.path.join(VOCAL_REMOVAL_OUTPUT_DIR, output_filename)
-            
-            logger.info(f"开始合成无人声视频...")
-            if not merge_audio_to_video(downloaded_video, no_vocals_path, output_video_path):
-                raise Exception("合成视频失败")
-            
-            # 5. 更新任务状态为完成
-            # 返回相对路径，便于构建 URL
-            relative_path = f"/vocal_removed/{output_filename}"
             update_vocal_removal_task(
                 db, task.id, 
                 status="completed", 
                 output_video_path=relative_path
             )
-            
-            logger.info(f"任务完成: {task.video_url} -> {relative_path}")
-            return {"success": True, "output_path": relative_path}
-            
-        finally:
-            # 清理临时目录
+        except Exception:
+            db.rollback()
             try:
-                shutil.rmtree(work_dir)
-            except Exception as e:
-                logger.warning(f"清理临时目录失败: {e}")
+                os.remove(output_video_path)
+            except OSError as e:
+                logger.warning(f"删除结果文件失败: {output_video_path}, {e}")
+            raise
+        
+        logger.info(f"任务完成: {task.video_url} -> {relative_path}")
+        return {"success": True, "output_path": relative_path}
                 
     except Exception as e:
         error_msg = str(e)
@@ -393,12 +758,113 @@ async def process_vocal_removal_task(task: VocalRemovalTask) -> dict:
         db.close()
 
 
+def spawn_task(handler, task, running: set, notifier) -> None:
+    """
+    在后台处理一个已领取的任务，占用一个并发槽位（running 中的一项）
+    任务结束后释放槽位并唤醒 Worker 领取下一个任务；单个任务的异常只记录日志
+    """
+    def on_done(t: asyncio.Task):
+        running.discard(t)
+        notifier.set()
+        if not t.cancelled() and t.exception() is not None:
+            logger.error(f"任务处理异常: {t.exception()}")
+    
+    t = asyncio.create_task(handler(task))
+    running.add(t)
+    t.add_done_callback(on_done)
+
+
+async def _heartbeat(model, task_id: int):
+    """任务处理期间定期刷新 updated_at，超过 TASK_PROCESSING_TIMEOUT 的耗时任务也不会被重复领取"""
+    interval = TASK_PROCESSING_TIMEOUT / 3
+    while True:
+        await asyncio.sleep(interval)
+        db = get_db_session()
+        try:
+            touch_processing_task(db, model, task_id)
+        except Exception as e:
+            logger.warning(f"刷新任务心跳失败: {task_id}, {e}")
+            db.rollback()
+        finally:
+            db.close()
+
+
+def with_heartbeat(model, handler):
+    """包装任务处理函数：处理期间为该任务发送心跳（TASK_PROCESSING_TIMEOUT 为 0 时不回收，也无需心跳）"""
+    if TASK_PROCESSING_TIMEOUT <= 0:
+        return handler
+    
+    async def run(task):
+        heartbeat = asyncio.create_task(_heartbeat(model, task.id))
+        try:
+            return await handler(task)
+        finally:
+            heartbeat.cancel()
+    
+    return run
+
+
+# ===== 新任务通知 =====
+# API 创建任务后通过 notify 模块推送通知，Worker 立即处理；
+# 在收到第一个通知之前按短间隔轮询（API 与 Worker 不在同一回环地址时通知收不到）
+_notify_transport: Optional[asyncio.DatagramTransport] = None
+_notify_received = False
+
+
+class _NotifyProtocol(asyncio.DatagramProtocol):
+    def datagram_received(self, data: bytes, addr):
+        global _notify_received
+        notifier = task_notifiers.get(data.decode(errors='ignore'))
+        if notifier is not None:
+            if not _notify_received:
+                _notify_received = True
+                logger.info(f"已收到任务通知，轮询间隔放宽为 {NOTIFIED_CHECK_INTERVAL} 秒")
+            notifier.set()
+
+
+def _check_interval(interval: float) -> float:
+    """兜底轮询间隔：通知确认可达后放宽到 NOTIFIED_CHECK_INTERVAL"""
+    return max(interval, NOTIFIED_CHECK_INTERVAL) if _notify_received else interval
+
+
+async def ensure_notify_listener():
+    """启动 UDP 通知监听（幂等）；端口被占用等情况下只记录警告，依靠轮询兜底"""
+    global _notify_transport
+    
+    addr = parse_notify_addr()
+    if _notify_transport is not None or addr is None:
+        return
+    
+    try:
+        _notify_transport, _ = await asyncio.get_running_loop().create_datagram_endpoint(
+            _NotifyProtocol, local_addr=addr
+        )
+        logger.info(f"任务通知监听已启动: {WORKER_NOTIFY_ADDR}")
+    except OSError as e:
+        logger.warning(f"任务通知监听启动失败，仅使用轮询: {e}")
+
+
+def close_notify_listener():
+    """关闭 UDP 通知监听"""
+    global _notify_transport
+    
+    if _notify_transport is not None:
+        _notify_transport.close()
+        _notify_transport = None
+
+
 async def vocal_removal_worker():
     """
     人声去除 Worker
-    定期检查待处理的任务并执行
+    收到新任务通知时立即处理，否则按固定间隔检查待处理的任务
     """
     logger.info("人声去除 Worker 已启动")
+    notifier = task_notifiers["vocal"]
+    notifier.bind()
+    await ensure_notify_listener()
+    
+    # 预热 Demucs 子进程，模型常驻，后续任务无需重复加载
+    warm_up_demucs_pool()
     
     # 启动时清理失败的任务，允许重新处理
     db = get_db_session()
@@ -409,25 +875,37 @@ async def vocal_removal_worker():
     finally:
         db.close()
     
+    handler = with_heartbeat(VocalRemovalTask, process_vocal_removal_task)
+    running: set = set()  # 正在处理的任务，数量即已占用的并发槽位
+    
     while True:
         try:
-            # 检查待处理的任务
-            db = get_db_session()
-            try:
-                pending_tasks = get_pending_vocal_removal_tasks(db)
+            # 先清除通知再查询，查询期间到达的新任务或结束的任务会再次唤醒
+            notifier.clear()
+            
+            # 有空闲槽位就领取对应数量的任务（领取时即标记为 processing），每个任务在后台单独处理，
+            # 任一任务结束即可领取下一个，不必等同批中最慢的任务
+            free_slots = VOCAL_CONCURRENCY - len(running)
+            pending_tasks = []
+            if free_slots > 0:
+                db = get_db_session()
+                try:
+                    pending_tasks = claim_pending_vocal_removal_tasks(db, limit=free_slots)
+                finally:
+                    db.close()
                 
                 for task in pending_tasks:
                     logger.info(f"发现待处理任务: {task.video_url}")
-                    await process_vocal_removal_task(task)
-                    
-            finally:
-                db.close()
+                    spawn_task(handler, task, running, notifier)
             
-            # 等待一段时间再检查
-            await asyncio.sleep(VOCAL_REMOVAL_CHECK_INTERVAL)
+            # 领到任务且仍有空闲槽位时立即再领取，否则等待新任务通知或任务结束，超时后兜底再检查
+            if not pending_tasks or len(running) >= VOCAL_CONCURRENCY:
+                await notifier.wait(_check_interval(VOCAL_REMOVAL_CHECK_INTERVAL))
             
         except asyncio.CancelledError:
             logger.info("人声去除 Worker 被取消")
+            for t in running:
+                t.cancel()
             break
         except Exception as e:
             logger.error(f"人声去除 Worker 执行出错: {e}")
@@ -442,17 +920,17 @@ def get_cache_key(video_url: str, cache_type: str) -> str:
     return f"{url_hash}:{cache_type}"
 
 
-def create_mute_video(video_path: str, output_path: str) -> bool:
+async def create_mute_video(video_path: str, output_path: str) -> bool:
     """创建无声视频（移除音轨）"""
     try:
         cmd = [
-            'ffmpeg', '-y',
+            *FFMPEG_BASE_ARGS,
             '-i', video_path,
             '-c:v', 'copy',
             '-an',  # 移除音轨
             output_path
         ]
-        result = subprocess.run(cmd, capture_output=True, text=True)
+        result = await run_command(cmd)
         if result.returncode != 0:
             logger.error(f"创建无声视频失败: {result.stderr}")
             return False
@@ -463,11 +941,34 @@ def create_mute_video(video_path: str, output_path: str) -> bool:
         return False
 
 
-def merge_audio_files(audio1_path: str, audio2_path: str, output_path: str) -> bool:
+async def encode_background_audio(input_path: str, output_path: str) -> bool:
+    """
+    将 Demucs 输出的 WAV 背景音按 BACKGROUND_AUDIO_CODEC 压缩，只在写入缓存时执行一次
+    默认 FLAC 无损（约 5 MB/分钟，为 WAV 的一半），合成时只做一次 AAC 编码；
+    缓存体积优先时可选 opus / aac（约为 WAV 的 1/10）
+    """
+    try:
+        cmd = [
+            *FFMPEG_BASE_ARGS,
+            '-i', input_path,
+            *BACKGROUND_AUDIO_FORMATS[BACKGROUND_AUDIO_CODEC][1],
+            output_path
+        ]
+        result = await run_command(cmd)
+        if result.returncode != 0:
+            logger.error(f"压缩背景音失败: {result.stderr}")
+            return False
+        return True
+    except Exception as e:
+        logger.error(f"压缩背景音异常: {e}")
+        return False
+
+
+async def merge_audio_files(audio1_path: str, audio2_path: str, output_path: str) -> bool:
     """合并两个音频文件（混音）"""
     try:
         cmd = [
-            'ffmpeg', '-y',
+            *FFMPEG_BASE_ARGS,
             '-i', audio1_path,
             '-i', audio2_path,
             '-filter_complex', '[0:a][1:a]amix=inputs=2:duration=longest[out]',
@@ -475,7 +976,7 @@ def merge_audio_files(audio1_path: str, audio2_path: str, output_path: str) -> b
             '-c:a', 'aac',
             output_path
         ]
-        result = subprocess.run(cmd, capture_output=True, text=True)
+        result = await run_command(cmd)
         if result.returncode != 0:
             logger.error(f"合并音频失败: {result.stderr}")
             return False
@@ -486,7 +987,56 @@ def merge_audio_files(audio1_path: str, audio2_path: str, output_path: str) -> b
         return False
 
 
-def stack_videos_vertical(top_video: str, bottom_video: str, output_path: str, 
+# 硬件 H.264 编码器：按优先级排列，对应 -hwaccel 解码参数和编码参数
+_HW_ENCODER_ARGS = {
+    'h264_nvenc': (['-hwaccel', 'cuda'], ['-c:v', 'h264_nvenc', '-preset', 'p4', '-cq', '23']),
+    'h264_videotoolbox': (['-hwaccel', 'videotoolbox'], ['-c:v', 'h264_videotoolbox', '-q:v', '65']),
+}
+_SOFTWARE_ENCODE_ARGS = ['-c:v', 'libx264', '-preset', 'fast', '-crf', '23']
+
+# 可通过 FFMPEG_HW_ENCODER 指定编码器，设为 none 则强制使用 libx264
+FFMPEG_HW_ENCODER = os.environ.get("FFMPEG_HW_ENCODER", "auto").lower()
+
+# 硬件编码失败而 libx264 成功后置为 True，之后不再尝试硬件编码
+# （静态编译的 ffmpeg 在没有 GPU 的机器上也会列出 h264_nvenc）
+_hw_encoder_failed = False
+
+
+@lru_cache(maxsize=1)
+def detect_hw_encoder() -> Optional[str]:
+    """
+    检测 ffmpeg 可用的硬件 H.264 编码器（只检测一次，结果缓存）
+    没有可用的硬件编码器时返回 None
+    """
+    if FFMPEG_HW_ENCODER in _HW_ENCODER_ARGS:
+        return FFMPEG_HW_ENCODER
+    if FFMPEG_HW_ENCODER != "auto":
+        return None
+    
+    try:
+        result = subprocess.run(
+            ['ffmpeg', '-hide_banner', '-encoders'],
+            stdin=subprocess.DEVNULL, capture_output=True, text=True, timeout=10
+        )
+    except (OSError, subprocess.TimeoutExpired) as e:
+        logger.warning(f"检测 ffmpeg 编码器失败: {e}")
+        return None
+    
+    for encoder in _HW_ENCODER_ARGS:
+        if encoder in result.stdout:
+            logger.info(f"使用硬件编码器: {encoder}")
+            return encoder
+    return None
+
+
+def _video_encode_args(encoder: Optional[str]) -> tuple:
+    """返回 (输入前的解码参数, 视频编码参数)"""
+    if encoder in _HW_ENCODER_ARGS:
+        return _HW_ENCODER_ARGS[encoder]
+    return [], _SOFTWARE_ENCODE_ARGS
+
+
+async def stack_videos_vertical(top_video: str, bottom_video: str, output_path: str, 
                           audio_path: str = None, output_width: int = 720) -> bool:
     """
     上下拼接两个视频，生成竖版视频
@@ -506,58 +1056,59 @@ def stack_videos_vertical(top_video: str, bottom_video: str, output_path: str,
     Returns:
         是否成功
     """
+    square_size = output_width  # 720x720 用于用户视频
+    
+    filter_complex = (
+        # 顶部视频：宽度720，高度自适应（保持宽高比，完整显示不裁剪）
+        f'[0:v]scale={output_width}:-2[top];'
+        # 底部视频：放大并居中裁剪为正方形
+        f'[1:v]scale={square_size}:{square_size}:force_original_aspect_ratio=increase,'
+        f'crop={square_size}:{square_size}[bottom];'
+        f'[top][bottom]vstack=inputs=2[v]'
+    )
+    
+    if audio_path and os.path.exists(audio_path):
+        # 使用单独的音频文件（第三个输入）
+        audio_inputs = ['-i', audio_path]
+        audio_map = '2:a'
+    else:
+        # 使用下方视频（用户录制）的音频
+        audio_inputs = []
+        audio_map = '1:a?'
+    
+    def build_cmd(encoder: Optional[str]) -> list:
+        input_args, encode_args = _video_encode_args(encoder)
+        return [
+            *FFMPEG_BASE_ARGS,
+            *input_args, '-i', top_video,
+            *input_args, '-i', bottom_video,
+            *audio_inputs,
+            '-filter_complex', filter_complex,
+            '-map', '[v]',
+            '-map', audio_map,
+            *encode_args,
+            '-c:a', 'aac',
+            '-shortest',
+            output_path
+        ]
+    
+    global _hw_encoder_failed
+    
     try:
-        square_size = output_width  # 720x720 用于用户视频
-        
-        # 构建 ffmpeg 命令
-        if audio_path and os.path.exists(audio_path):
-            # 使用单独的音频文件
-            cmd = [
-                'ffmpeg', '-y',
-                '-i', top_video,
-                '-i', bottom_video,
-                '-i', audio_path,  # 第三个输入是音频
-                '-filter_complex',
-                # 顶部视频：宽度720，高度自适应（保持宽高比，完整显示不裁剪）
-                f'[0:v]scale={output_width}:-2[top];'
-                # 底部视频：放大并居中裁剪为正方形
-                f'[1:v]scale={square_size}:{square_size}:force_original_aspect_ratio=increase,'
-                f'crop={square_size}:{square_size}[bottom];'
-                f'[top][bottom]vstack=inputs=2[v]',
-                '-map', '[v]',
-                '-map', '2:a',  # 使用第三个输入（单独的音频文件）
-                '-c:v', 'libx264',
-                '-preset', 'fast',
-                '-crf', '23',
-                '-c:a', 'aac',
-                '-shortest',
-                output_path
-            ]
-        else:
-            # 使用下方视频的音频
-            cmd = [
-                'ffmpeg', '-y',
-                '-i', top_video,
-                '-i', bottom_video,
-                '-filter_complex',
-                # 顶部视频：宽度720，高度自适应（保持宽高比，完整显示不裁剪）
-                f'[0:v]scale={output_width}:-2[top];'
-                # 底部视频：放大并居中裁剪为正方形
-                f'[1:v]scale={square_size}:{square_size}:force_original_aspect_ratio=increase,'
-                f'crop={square_size}:{square_size}[bottom];'
-                f'[top][bottom]vstack=inputs=2[v]',
-                '-map', '[v]',
-                '-map', '1:a?',  # 使用下方视频（用户录制）的音频
-                '-c:v', 'libx264',
-                '-preset', 'fast',
-                '-crf', '23',
-                '-c:a', 'aac',
-                '-shortest',
-                output_path
-            ]
+        hw_encoder = None if _hw_encoder_failed else detect_hw_encoder()
+        cmd = build_cmd(hw_encoder)
         
         logger.info(f"执行视频拼接命令: {' '.join(cmd)}")
-        result = subprocess.run(cmd, capture_output=True, text=True)
+        result = await run_command(cmd)
+        
+        if result.returncode != 0 and hw_encoder:
+            # 编码器编译进了 ffmpeg 但驱动 / 设备不可用时会失败，回退到 CPU 编码
+            logger.warning(f"硬件编码 {hw_encoder} 失败，回退到 libx264: {result.stderr}")
+            result = await run_command(build_cmd(None))
+            if result.returncode == 0:
+                # 同样的输入用 libx264 能成功，说明硬件编码器不可用，后续任务直接使用 libx264
+                _hw_encoder_failed = True
+                logger.warning(f"硬件编码器 {hw_encoder} 不可用，后续改用 libx264")
         
         if result.returncode != 0:
             logger.error(f"视频拼接失败: {result.stderr}")
@@ -589,11 +1140,65 @@ def get_mute_video_from_url(video_url: str, work_dir: str) -> Optional[str]:
     return None  # 需要下载并处理
 
 
+def migrate_legacy_media_cache(db: Session) -> int:
+    """
+    迁移旧哈希方案（md5 前 16 位）生成的媒体缓存：
+    按当前 get_url_hash 重命名缓存文件并更新 cache_key / file_path，
+    文件已丢失或新 key 已存在的旧记录直接删除
+    返回迁移（含删除）的记录数
+    """
+    base_dir = os.path.dirname(__file__)
+    migrated = 0
+    
+    for cache in db.query(MediaCache).all():
+        old_hash, _, suffix = cache.cache_key.partition(':')
+        new_hash = get_url_hash(cache.source_url)
+        if old_hash == new_hash:
+            continue
+        
+        new_key = f"{new_hash}:{suffix}"
+        old_path = os.path.join(base_dir, cache.file_path.lstrip('/'))
+        rel_dir, filename = os.path.split(cache.file_path)
+        new_file_path = f"{rel_dir}/{filename.replace(old_hash, new_hash, 1)}"
+        new_path = os.path.join(base_dir, new_file_path.lstrip('/'))
+        
+        if not os.path.exists(old_path) or get_media_cache(db, new_key):
+            db.delete(cache)
+        else:
+            os.replace(old_path, new_path)
+            cache.cache_key = new_key
+            cache.file_path = new_file_path
+        migrated += 1
+    
+    if migrated:
+        db.commit()
+    return migrated
+
+
+# 按视频 URL 合并进行中的背景音 / 无声视频创建：同一视频只跑一次流水线，其余调用方等待同一个结果
+_background_inflight: dict[str, asyncio.Future] = {}
+
+
 async def get_or_create_background_and_mute_video(video_url: str) -> tuple:
     """
     获取或创建背景音和无声视频
     返回: (background_audio_path, mute_video_path) 或 (None, None) 如果失败
     """
+    url_hash = get_url_hash(video_url)
+    future = _background_inflight.get(url_hash)
+    if future is None:
+        future = asyncio.ensure_future(_get_or_create_background_and_mute_video(video_url))
+        _background_inflight[url_hash] = future
+        future.add_done_callback(lambda _: _background_inflight.pop(url_hash, None))
+    else:
+        logger.info(f"等待进行中的背景音和无声视频创建: {video_url}")
+    
+    # shield: 单个调用方被取消时不影响其他等待同一结果的任务
+    return await asyncio.shield(future)
+
+
+async def _get_or_create_background_and_mute_video(video_url: str) -> tuple:
+    """获取或创建背景音和无声视频（同一 URL 同时只会有一个在执行）"""
     db = get_db_session()
     
     try:
@@ -628,44 +1233,45 @@ async def get_or_create_background_and_mute_video(video_url: str) -> tuple:
             if not await download_video(video_url, downloaded_video):
                 raise Exception("下载视频失败")
             
-            # 2. 提取音频
-            audio_path = os.path.join(work_dir, "audio.mp3")
-            if not extract_audio(downloaded_video, audio_path):
-                raise Exception("提取音频失败")
-            
-            # 3. 使用 Demucs 分离人声
+            # 2. 使用 Demucs 分离人声（直接读取视频的音轨，无需先提取音频）
             demucs_output_dir = os.path.join(work_dir, "demucs_output")
             os.makedirs(demucs_output_dir, exist_ok=True)
             
-            no_vocals_path = remove_vocals_with_demucs(audio_path, demucs_output_dir)
+            no_vocals_path = await run_demucs(downloaded_video, demucs_output_dir)
             if not no_vocals_path:
                 raise Exception("人声分离失败")
             
-            # 4. 保存背景音到缓存
-            bg_filename = f"{url_hash}_background.wav"
+            # 3. 保存背景音到缓存（按 BACKGROUND_AUDIO_CODEC 压缩；压缩失败时保留原始 WAV）
+            bg_filename = f"{url_hash}_background{BACKGROUND_AUDIO_FORMATS[BACKGROUND_AUDIO_CODEC][0]}"
             bg_output_path = os.path.join(BACKGROUND_CACHE_DIR, bg_filename)
-            shutil.copy(no_vocals_path, bg_output_path)
+            if not await encode_background_audio(no_vocals_path, bg_output_path):
+                bg_filename = f"{url_hash}_background.wav"
+                bg_output_path = os.path.join(BACKGROUND_CACHE_DIR, bg_filename)
+                await asyncio.to_thread(copy_media_file, no_vocals_path, bg_output_path)
             
-            # 创建背景音缓存记录
-            if not bg_cache:
-                create_media_cache(
-                    db, bg_cache_key, "background",
-                    f"/media_cache/background/{bg_filename}", video_url
-                )
-            
-            # 5. 创建无声视频
+            # 4. 创建无声视频
             mute_filename = f"{url_hash}_mute{video_ext}"
             mute_output_path = os.path.join(MUTE_VIDEO_CACHE_DIR, mute_filename)
             
-            if not create_mute_video(downloaded_video, mute_output_path):
+            if not await create_mute_video(downloaded_video, mute_output_path):
                 raise Exception("创建无声视频失败")
             
-            # 创建无声视频缓存记录
+            # 一次性写入缺失的缓存记录；已有的背景音记录可能指向旧格式文件，更新路径
+            cache_rows = []
+            if bg_cache:
+                bg_cache.file_path = f"/media_cache/background/{bg_filename}"
+                db.commit()
+            else:
+                cache_rows.append({
+                    "cache_key": bg_cache_key, "cache_type": "background",
+                    "file_path": f"/media_cache/background/{bg_filename}", "source_url": video_url
+                })
             if not mute_cache:
-                create_media_cache(
-                    db, mute_cache_key, "mute-video",
-                    f"/media_cache/mute_video/{mute_filename}", video_url
-                )
+                cache_rows.append({
+                    "cache_key": mute_cache_key, "cache_type": "mute-video",
+                    "file_path": f"/media_cache/mute_video/{mute_filename}", "source_url": video_url
+                })
+            bulk_create_media_cache(db, cache_rows)
             
             logger.info(f"缓存创建完成: {video_url}")
             return (bg_output_path, mute_output_path)
@@ -705,9 +1311,6 @@ async def process_composite_video_task(task: UserDubbing) -> dict:
     mode = getattr(task, 'mode', None) or 'audio'
     
     try:
-        # 更新状态为处理中
-        update_user_dubbing(db, task.id, status="processing")
-        
         # 创建临时工作目录
         url_hash = get_url_hash(task.original_video_url)
         work_dir = tempfile.mkdtemp(prefix=f"composite_final_{url_hash}_")
@@ -771,7 +1374,7 @@ async def process_audio_dubbing_task(task: UserDubbing, work_dir: str) -> str:
     
     # 3. 合并用户配音和背景音
     merged_audio_path = os.path.join(work_dir, "merged_audio.aac")
-    if not merge_audio_files(user_audio_path, bg_audio_path, merged_audio_path):
+    if not await merge_audio_files(user_audio_path, bg_audio_path, merged_audio_path):
         raise Exception("合并音频失败")
     
     # 4. 将合成音频与无声视频合成
@@ -779,7 +1382,7 @@ async def process_audio_dubbing_task(task: UserDubbing, work_dir: str) -> str:
     output_filename = f"{task.user_id}_{task.id}_composite{video_ext}"
     output_video_path = os.path.join(USER_DUBBINGS_DIR, output_filename)
     
-    if not merge_audio_to_video(mute_video_path, merged_audio_path, output_video_path):
+    if not await merge_audio_to_video(mute_video_path, merged_audio_path, output_video_path):
         raise Exception("合成最终视频失败")
     
     return f"/user_dubbings/{output_filename}"
@@ -824,11 +1427,11 @@ async def process_video_dubbing_task(task: UserDubbing, work_dir: str) -> str:
     # 3. 从用户视频提取音频
     user_audio_path = os.path.join(work_dir, "user_audio.aac")
     extract_audio_cmd = [
-        'ffmpeg', '-y', '-i', user_video_path,
+        *FFMPEG_BASE_ARGS, '-i', user_video_path,
         '-vn', '-acodec', 'aac', '-b:a', '128k',
         user_audio_path
     ]
-    result = subprocess.run(extract_audio_cmd, capture_output=True, text=True)
+    result = await run_command(extract_audio_cmd)
     if result.returncode != 0:
         logger.warning(f"提取用户音频失败: {result.stderr}")
         user_audio_path = None
@@ -838,7 +1441,7 @@ async def process_video_dubbing_task(task: UserDubbing, work_dir: str) -> str:
     if bg_audio_path and user_audio_path:
         # 两个音频都有，混合
         final_audio_path = os.path.join(work_dir, "mixed_audio.aac")
-        if not merge_audio_files(user_audio_path, bg_audio_path, final_audio_path):
+        if not await merge_audio_files(user_audio_path, bg_audio_path, final_audio_path):
             logger.warning("混合音频失败，只使用用户音频")
             final_audio_path = user_audio_path
     elif user_audio_path:
@@ -850,7 +1453,7 @@ async def process_video_dubbing_task(task: UserDubbing, work_dir: str) -> str:
     output_filename = f"{task.user_id}_{task.id}_video_dubbing.mp4"
     output_video_path = os.path.join(USER_DUBBINGS_DIR, output_filename)
     
-    if not stack_videos_vertical(mute_video_path, user_video_path, output_video_path, final_audio_path):
+    if not await stack_videos_vertical(mute_video_path, user_video_path, output_video_path, final_audio_path):
         raise Exception("视频拼接失败")
     
     return f"/user_dubbings/{output_filename}"
@@ -862,35 +1465,60 @@ async def composite_video_worker():
     定期检查待处理的任务并执行
     """
     logger.info("视频合成 Worker 已启动")
+    notifier = task_notifiers["composite"]
+    notifier.bind()
+    await ensure_notify_listener()
+    
+    # 启动时检测一次硬件编码器，避免第一个任务时才阻塞检测
+    await asyncio.to_thread(detect_hw_encoder)
     
-    # 启动时清理失败的任务
+    # 启动时清理失败的任务，并迁移旧哈希方案的媒体缓存
     db = get_db_session()
     try:
         deleted_count = cleanup_failed_user_dubbings(db)
         if deleted_count > 0:
             logger.info(f"已清理 {deleted_count} 个失败的视频合成任务")
+        
+        migrated_count = migrate_legacy_media_cache(db)
+        if migrated_count > 0:
+            logger.info(f"已迁移 {migrated_count} 条旧媒体缓存记录")
+    except Exception as e:
+        logger.error(f"迁移媒体缓存失败: {e}")
+        db.rollback()
     finally:
         db.close()
     
+    handler = with_heartbeat(UserDubbing, process_composite_video_task)
+    running: set = set()  # 正在处理的任务，数量即已占用的并发槽位
+    
     while True:
         try:
-            # 检查待处理的任务
-            db = get_db_session()
-            try:
-                pending_tasks = get_pending_user_dubbings(db)
+            # 先清除通知再查询，查询期间到达的新任务或结束的任务会再次唤醒
+            notifier.clear()
+            
+            # 有空闲槽位就领取对应数量的任务（领取时即标记为 processing），每个任务在后台单独处理，
+            # 任一任务结束即可领取下一个，不必等同批中最慢的任务
+            free_slots = COMPOSITE_CONCURRENCY - len(running)
+            pending_tasks = []
+            if free_slots > 0:
+                db = get_db_session()
+                try:
+                    pending_tasks = claim_pending_user_dubbings(db, limit=free_slots)
+                finally:
+                    db.close()
                 
                 for task in pending_tasks:
                     logger.info(f"发现待处理的合成任务: {task.id}")
-                    await process_composite_video_task(task)
-                    
-            finally:
-                db.close()
+                    spawn_task(handler, task, running, notifier)
             
-            # 等待一段时间再检查
-            await asyncio.sleep(COMPOSITE_VIDEO_CHECK_INTERVAL)
+            # 领到任务且仍有空闲槽位时立即再领取，否则等待新任务通知或任务结束，超时后兜底再检查
+            if not pending_tasks or len(running) >= COMPOSITE_CONCURRENCY:
+                await notifier.wait(_check_interval(COMPOSITE_VIDEO_CHECK_INTERVAL))
             
         except asyncio.CancelledError:
             logger.info("视频合成 Worker 被取消")
+            for t in running:
+                t.cancel()
             break
         except Exception as e:
             logger.error(f"视频合成 Worker 执行出错: {e}")
@@ -903,10 +1531,22 @@ _vocal_removal_worker_task: Optional[asyncio.Task] = None
 _composite_video_worker_task: Optional[asyncio.Task] = None
 
 
+def enable_eager_task_factory():
+    """
+    在当前事件循环启用 eager task factory（Python 3.12+）
+    新建的 Task 会先同步执行到第一个 await，命中缓存等可同步完成的协程无需再经过一次调度
+    """
+    if hasattr(asyncio, "eager_task_factory"):
+        asyncio.get_running_loop().set_task_factory(asyncio.eager_task_factory)
+        logger.info("已启用 eager task factory")
+
+
 def start_worker():
     """启动 Worker"""
     global _worker_task, _vocal_removal_worker_task, _composite_video_worker_task
     
+    enable_eager_task_factory()
+    
     if _worker_task is None or _worker_task.done():
         _worker_task = asyncio.create_task(recommendation_worker())
         logger.info("推荐片段 Worker 任务已创建")
@@ -934,4 +1574,7 @@ def stop_worker():
     
     if _composite_video_worker_task and not _composite_video_worker_task.done():
         _composite_video_worker_task.cancel()
-        logger.info("视频合成 Worker 任务已取消")
\ No newline at end of file
+        logger.info("视频合成 Worker 任务已取消")
+    
+    shutdown_demucs_pool()
+    close_notify_listener()
\ No newline at end of file
@@ -9,18 +9,83 @@ import os
 import sys
 import re
 import json
+import stat
 import shutil
+import hashlib
 import subprocess
 import argparse
+import threading
+import time
+import random
+import bisect
+import functools
 from pathlib import Path
 from datetime import datetime
-from typing import List, Dict, Optional, Tuple
+from typing import Iterator, List, Dict, Optional, Tuple, Union
 from concurrent.futures import ThreadPoolExecutor, as_completed
+import httpx
+import openai
 from openai import OpenAI
 
+try:
+    import tiktoken
+except ImportError:
+    tiktoken = None
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
 # 配置
 WHISPER_EXE = r"D:\Faster-Whisper-XXL_r192.3.3_windows\Faster-Whisper-XXL\faster-whisper-xxl.exe"
 FFMPEG_EXE = "ffmpeg"  # 假设 ffmpeg 在 PATH 中，如果不在请修改为完整路径
+FFPROBE_EXE = "ffprobe"
+CLIP_WORKERS = 4  # 并行截取片段 / 缩略图的线程数
+KEYFRAME_MAX_SNAP_SECONDS = 2.0  # 片段起点前移到关键帧的最大距离，超过则该片段重新编码
+
+# 重新编码片段时可用的硬件 H.264 编码器（按优先级排列）及其编码参数
+_HW_ENCODER_ARGS = {
+    "h264_nvenc": ["-c:v", "h264_nvenc", "-preset", "p4", "-cq", "23"],
+    "h264_qsv": ["-c:v", "h264_qsv", "-preset", "veryfast", "-global_quality", "23"],
+    "h264_videotoolbox": ["-c:v", "h264_videotoolbox", "-q:v", "65"],
+}
+_SOFTWARE_ENCODE_ARGS = ["-c:v", "libx264"]
+# 可通过 PROCESS_VIDEO_HW_ENCODER 指定编码器，设为 none 则强制使用 libx264
+PROCESS_VIDEO_HW_ENCODER = os.environ.get('PROCESS_VIDEO_HW_ENCODER', 'auto').lower()
+# --encoder 参数的取值
+ENCODER_CHOICES = {
+    "auto": "auto",
+    "cpu": "none",
+    "nvenc": "h264_nvenc",
+    "qsv": "h264_qsv",
+    "vt": "h264_videotoolbox",
+}
+# 硬件编码器初始化失败（驱动不支持等）后不再使用
+_hw_encoder_failed = threading.Event()
+
+# 字幕内容缓存：{视频目录}/.srt_cache/{内容 key}.srt
+SRT_CACHE_DIRNAME = ".srt_cache"
+SRT_CACHE_MAX_FILES = 1000
+SRT_CACHE_SAMPLE_BYTES = 4 * 1024 * 1024
+WHISPER_BATCH_SIZE = 50  # 批量识别时每次调用的视频数（避免命令行过长）
+
+# 跨视频的字幕翻译缓存：{视频目录}/.translation_cache.json，key 为小写的英文原文
+TRANSLATION_CACHE_FILENAME = ".translation_cache.json"
+_translation_cache_lock = threading.Lock()
+
+# 单个视频的中间结果（ChatGPT 选择和翻译），重试时跳过已完成的步骤
+VIDEO_STATE_FILENAME = ".state.json"
+
+# ChatGPT 响应缓存：按请求内容（模型、消息、参数）的 sha256 保存返回的 JSON，--no-cache 可关闭
+OPENAI_CACHE_DIR = os.path.join(
+    os.environ.get('PROCESS_VIDEO_CACHE_DIR', os.path.join(os.path.expanduser('~'), '.cache', 'process_video')),
+    'openai'
+)
+OPENAI_CACHE_ENABLED = True
+
+# 多个视频并行处理时，faster-whisper-xxl 同时只运行一个
+_whisper_lock = threading.Lock()
 
 # 从 .env 文件读取 API Key
 OPENAI_API_KEY = None
@@ -38,14 +103,201 @@ if not OPENAI_API_KEY:
     OPENAI_API_KEY = os.environ.get('OPENAI_API_KEY')
 
 
-def file_exists_and_not_empty(filepath: str) -> bool:
+def _ffmpeg_threads_per_invocation(n_workers: int) -> int:
+    """
+    每个 ffmpeg 进程可用的线程数，使 n_workers 个并行进程的总线程数约等于 CPU 核数
+    可通过环境变量 PROCESS_VIDEO_FFMPEG_THREADS 指定（范围 1-64）
+    """
+    env_value = os.environ.get('PROCESS_VIDEO_FFMPEG_THREADS')
+    if env_value:
+        try:
+            return min(64, max(1, int(env_value)))
+        except ValueError:
+            print(f"忽略无效的 PROCESS_VIDEO_FFMPEG_THREADS: {env_value}")
+    return max(1, (os.cpu_count() or n_workers) // n_workers)
+
+
+class RateLimiter:
+    """
+    OpenAI 请求限速（令牌桶）：同时限制每分钟请求数和每分钟 token 数
+    多个线程共享，预算不足时 acquire 会阻塞等待
+    """
+    def __init__(self, rpm: int, tpm: int):
+        self.rpm = rpm
+        self.tpm = tpm
+        self._requests = float(rpm)
+        self._tokens = float(tpm)
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+    
+    def _refill(self):
+        now = time.monotonic()
+        elapsed = now - self._updated
+        self._updated = now
+        self._requests = min(self.rpm, self._requests + elapsed * self.rpm / 60)
+        self._tokens = min(self.tpm, self._tokens + elapsed * self.tpm / 60)
+    
+    def acquire(self, estimated_tokens: int):
+        """获取一次请求的额度，estimated_tokens 超过 tpm 时按 tpm 计算"""
+        estimated_tokens = min(estimated_tokens, self.tpm)
+        while True:
+            with self._lock:
+                self._refill()
+                if self._requests >= 1 and self._tokens >= estimated_tokens:
+                    self._requests -= 1
+                    self._tokens -= estimated_tokens
+                    return
+                # 计算两个桶都补足所需的等待时间
+                wait = max(
+                    (1 - self._requests) * 60 / self.rpm,
+                    (estimated_tokens - self._tokens) * 60 / self.tpm,
+                )
+            time.sleep(max(wait, 0.05))
+
+
+OPENAI_RATE_LIMITER = RateLimiter(
+    rpm=int(os.environ.get('OPENAI_RPM', 500)),
+    tpm=int(os.environ.get('OPENAI_TPM', 200_000)),
+)
+
+# 可重试的 OpenAI 异常：限流、连接失败、超时、服务端 5xx
+RETRYABLE_OPENAI_ERRORS = (
+    openai.RateLimitError,
+    openai.APIConnectionError,
+    openai.APITimeoutError,
+    openai.InternalServerError,
+)
+
+
+def retry_with_backoff(max_attempts: int = 5, base: float = 1.0, factor: float = 2.0, jitter: bool = True):
+    """对可重试的 OpenAI 异常做指数退避重试，其他异常直接抛出"""
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            for attempt in range(1, max_attempts + 1):
+                try:
+                    return func(*args, **kwargs)
+                except RETRYABLE_OPENAI_ERRORS as e:
+                    if attempt == max_attempts:
+                        raise
+                    delay = base * factor ** (attempt - 1)
+                    if jitter:
+                        delay *= random.uniform(0.5, 1.5)
+                    print(f"OpenAI 请求失败（第 {attempt}/{max_attempts} 次），{delay:.1f} 秒后重试: {e}")
+                    time.sleep(delay)
+        return wrapper
+    return decorator
+
+
+def estimate_tokens(text: str) -> int:
+    """估算文本的 token 数（安装了 tiktoken 时精确计算）"""
+    if tiktoken is not None:
+        try:
+            return len(tiktoken.encoding_for_model("gpt-4o").encode(text))
+        except Exception:
+            pass
+    # 中英文混合文本大约每 3 个字符 1 个 token
+    return len(text) // 3 + 1
+
+
+_openai_client: Optional[OpenAI] = None
+_openai_client_lock = threading.Lock()
+
+
+def get_openai_client(api_key: str) -> OpenAI:
+    """
+    获取共享的 OpenAI 客户端（复用 keep-alive 连接，多线程安全）
+    重试由 create_chat_completion 负责，关闭 SDK 自带的重试
+    """
+    global _openai_client
+    
+    with _openai_client_lock:
+        if _openai_client is None or _openai_client.api_key != api_key:
+            _openai_client = OpenAI(
+                api_key=api_key,
+                max_retries=0,
+                timeout=120.0,  # 选择 + 翻译的 JSON 输出较长，留足生成时间
+                http_client=httpx.Client(
+                    limits=httpx.Limits(max_connections=32, max_keepalive_connections=16)
+                )
+            )
+        return _openai_client
+
+
+@retry_with_backoff(max_attempts=5, base=1.0, factor=2.0, jitter=True)
+def create_chat_completion(client: OpenAI, messages: List[Dict], **kwargs):
+    """调用 chat.completions.create，先按估算的 token 数限速，遇到临时错误自动重试"""
+    OPENAI_RATE_LIMITER.acquire(estimate_tokens(''.join(m["content"] for m in messages)))
+    return client.chat.completions.create(messages=messages, **kwargs)
+
+
+def chat_completion_json(client: OpenAI, messages: List[Dict], **kwargs) -> Dict:
+    """
+    请求 ChatGPT 并解析返回的 JSON
+    相同的请求（模型、消息和参数都相同）直接使用磁盘缓存中的结果，不再调用 API
+    """
+    cache_path = None
+    if OPENAI_CACHE_ENABLED:
+        request_key = json.dumps({"messages": messages, **kwargs}, sort_keys=True, ensure_ascii=False)
+        cache_path = os.path.join(OPENAI_CACHE_DIR, f"{hashlib.sha256(request_key.encode('utf-8')).hexdigest()}.json")
+        if file_exists_and_not_empty(cache_path):
+            try:
+                return read_json_file(cache_path)
+            except Exception as e:
+                print(f"读取 ChatGPT 缓存失败: {e}")
+    
+    response = create_chat_completion(client, messages, **kwargs)
+    result = json.loads(response.choices[0].message.content)
+    
+    if cache_path:
+        tmp_path = f"{cache_path}.{threading.get_ident()}.tmp"
+        try:
+            os.makedirs(OPENAI_CACHE_DIR, exist_ok=True)
+            write_json_file(tmp_path, result)
+            os.replace(tmp_path, cache_path)
+        except OSError as e:
+            print(f"写入 ChatGPT 缓存失败: {e}")
+    
+    return result
+
+
+def read_json_file(path: str):
+    """读取 JSON 文件（优先使用 orjson）"""
+    if orjson is not None:
+        with open(path, 'rb') as f:
+            return orjson.loads(f.read())
+    with open(path, 'r', encoding='utf-8') as f:
+        return json.load(f)
+
+
+def write_json_file(path: str, data):
+    """写入 JSON 文件（UTF-8，不转义中文，缩进 2 格；优先使用 orjson）"""
+    if orjson is not None:
+        with open(path, 'wb') as f:
+            f.write(orjson.dumps(data, option=orjson.OPT_INDENT_2 | orjson.OPT_NON_STR_KEYS))
+        return
+    with open(path, 'w', encoding='utf-8') as f:
+        json.dump(data, f, ensure_ascii=False, indent=2)
+
+
+def file_exists_and_not_empty(filepath: Union[str, os.DirEntry]) -> bool:
     """
     检查文件是否存在且内容不为空
     用于跳过已生成的文件，支持断点续传
+    只做一次 stat；传入 os.scandir 得到的 DirEntry 时直接使用其缓存的信息
     """
-    if not os.path.exists(filepath):
+    if isinstance(filepath, os.DirEntry):
+        return filepath.is_file() and filepath.stat().st_size > 0
+    try:
+        st = os.stat(filepath)
+    except OSError:
         return False
-    return os.path.getsize(filepath) > 0
+    return stat.S_ISREG(st.st_mode) and st.st_size > 0
+
+
+_WS_RE = re.compile(r'\s+')
+# Windows 不允许的目录名字符，统一替换为下划线
+_INVALID_DIRNAME_CHARS = str.maketrans(dict.fromkeys('<>:"/\\|?*', '_'))
 
 
 def sanitize_filename(filename: str) -> str:
@@ -56,7 +308,7 @@ def sanitize_filename(filename: str) -> str:
     # 去除首尾空格
     filename = filename.strip()
     # 将多个连续空格替换为单个空格
-    filename = re.sub(r'\s+', ' ', filename)
+    filename = _WS_RE.sub(' ', filename)
     return filename
 
 
@@ -65,80 +317,157 @@ def get_safe_output_dirname(video_name: str) -> str:
     获取安全的输出目录名
     清理文件名中的特殊字符和多余空格
     """
-    # 先清理空格
-    name = sanitize_filename(video_name)
-    # 替换 Windows 不允许的目录名字符
-    invalid_chars = r'<>:"/\|?*'
-    for char in invalid_chars:
-        name = name.replace(char, '_')
-    return name
+    # 先清理空格，再一次性替换 Windows 不允许的目录名字符
+    return sanitize_filename(video_name).translate(_INVALID_DIRNAME_CHARS)
 
 
 class SRTSubtitle:
     """SRT 字幕条目类"""
+    __slots__ = ('index', 'start_time', 'end_time', 'text', 'start_seconds', 'end_seconds')
+    
     def __init__(self, index: int, start_time: str, end_time: str, text: str):
         self.index = index
         self.start_time = start_time
         self.end_time = end_time
         self.text = text
+        # 构造时解析一次时间，后续直接读取
+        self.start_seconds = self._time_to_seconds(start_time)
+        self.end_seconds = self._time_to_seconds(end_time)
     
     def get_start_seconds(self) -> float:
-        """将开始时间转换为秒数"""
-        return self._time_to_seconds(self.start_time)
+        """开始时间（秒）"""
+        return self.start_seconds
     
     def get_end_seconds(self) -> float:
-        """将结束时间转换为秒数"""
-        return self._time_to_seconds(self.end_time)
+        """结束时间（秒）"""
+        return self.end_seconds
     
     def get_duration(self) -> float:
         """获取持续时间（秒）"""
-        return round(self.get_end_seconds() - self.get_start_seconds(), 2)
+        return round(self.end_seconds - self.start_seconds, 2)
     
     @staticmethod
     def _time_to_seconds(time_str: str) -> float:
         """将 SRT 时间格式转换为秒数"""
         # 格式: HH:MM:SS,mmm
-        time_str = time_str.replace(',', '.')
-        parts = time_str.split(':')
-        hours = int(parts[0])
-        minutes = int(parts[1])
-        seconds = float(parts[2])
-        return hours * 3600 + minutes * 60 + seconds
+        hours, minutes, seconds = time_str.split(':')
+        return int(hours) * 3600 + int(minutes) * 60 + float(seconds.replace(',', '.'))
 
 
-def parse_srt_file(srt_path: str) -> List[SRTSubtitle]:
-    """解析 SRT 字幕文件"""
-    subtitles = []
-    
-    with open(srt_path, 'r', encoding='utf-8') as f:
-        content = f.read()
-    
-    # 按空行分割字幕块
-    blocks = re.split(r'\n\s*\n', content.strip())
+# SRT 解析状态
+_WAIT_INDEX, _WAIT_TIME, _IN_TEXT, _SKIP_BLOCK = range(4)
+_TIME_SPLIT = '-->'
+
+
+def _build_subtitle(index: int, start_time: str, end_time: str, text_lines: List[str]) -> Optional[SRTSubtitle]:
+    """由解析出的字幕块构造 SRTSubtitle；没有文本或时间格式错误时返回 None"""
+    if not text_lines:
+        return None
+    try:
+        return SRTSubtitle(index, start_time, end_time, '\n'.join(text_lines).strip())
+    except ValueError:
+        return None
+
+
+def iter_srt_subtitles(srt_path: str) -> Iterator[SRTSubtitle]:
+    """
+    逐行解析 SRT 字幕文件（单次遍历的状态机：序号 -> 时间行 -> 文本... -> 空行）
+    格式不正确的字幕块会被跳过
+    """
+    state = _WAIT_INDEX
+    index = 0
+    start_time = end_time = ''
+    text_lines = []
     
-    for block in blocks:
-        lines = block.strip().split('\n')
-        if len(lines) >= 3:
-            try:
-                index = int(lines[0].strip())
-                time_line = lines[1].strip()
-                # 解析时间行：00:00:01,000 --> 00:00:04,000
-                time_match = re.match(r'(\d{2}:\d{2}:\d{2},\d{3})\s*-->\s*(\d{2}:\d{2}:\d{2},\d{3})', time_line)
-                if time_match:
-                    start_time = time_match.group(1)
-                    end_time = time_match.group(2)
-                    text = '\n'.join(lines[2:]).strip()
-                    subtitles.append(SRTSubtitle(index, start_time, end_time, text))
-            except (ValueError, IndexError):
+    with open(srt_path, 'r', encoding='utf-8-sig') as f:
+        for line in f:
+            line = line.rstrip('\r\n')
+            
+            if not line.strip():
+                # 空行结束当前字幕块
+                if state == _IN_TEXT:
+                    subtitle = _build_subtitle(index, start_time, end_time, text_lines)
+                    if subtitle:
+                        yield subtitle
+                state = _WAIT_INDEX
                 continue
-    
-    return subtitles
+            
+            if state == _WAIT_INDEX:
+                try:
+                    index = int(line.strip())
+                    state = _WAIT_TIME
+                except ValueError:
+                    state = _SKIP_BLOCK
+            elif state == _WAIT_TIME:
+                # 时间行：00:00:01,000 --> 00:00:04,000（箭头两侧空格可省略，结束时间后可能带有位置信息）
+                start, sep, end = line.partition(_TIME_SPLIT)
+                if sep and end.strip():
+                    start_time = start.strip()
+                    end_time = end.strip().split()[0]
+                    text_lines = []
+                    state = _IN_TEXT
+                else:
+                    state = _SKIP_BLOCK
+            elif state == _IN_TEXT:
+                text_lines.append(line)
+    
+    if state == _IN_TEXT:
+        subtitle = _build_subtitle(index, start_time, end_time, text_lines)
+        if subtitle:
+            yield subtitle
 
 
-def extract_subtitles(video_path: str, output_dir: str) -> str:
-    """使用 faster-whisper-xxl 提取字幕，或使用已存在的字幕文件"""
-    print(f"正在提取字幕: {video_path}")
-    
+def parse_srt_file(srt_path: str) -> List[SRTSubtitle]:
+    """解析 SRT 字幕文件"""
+    return list(iter_srt_subtitles(srt_path))
+
+
+def _video_content_key(video_path: str) -> str:
+    """
+    按视频内容生成缓存 key：文件大小 + 开头 4 MB + 结尾 4 MB 的 sha256
+    不读取整个文件，改名 / 移动后 key 不变
+    """
+    size = os.path.getsize(video_path)
+    digest = hashlib.sha256(str(size).encode())
+    with open(video_path, 'rb') as f:
+        digest.update(f.read(SRT_CACHE_SAMPLE_BYTES))
+        if size > SRT_CACHE_SAMPLE_BYTES:
+            f.seek(max(SRT_CACHE_SAMPLE_BYTES, size - SRT_CACHE_SAMPLE_BYTES))
+            digest.update(f.read())
+    return digest.hexdigest()[:32]
+
+
+def _link_or_copy(src: str, dst: str):
+    """同一文件系统上创建硬链接（不复制数据），否则复制文件"""
+    if os.path.exists(dst):
+        os.remove(dst)
+    try:
+        os.link(src, dst)
+    except OSError:
+        shutil.copy2(src, dst)
+
+
+def _store_srt_cache(srt_path: str, cache_dir: str, cached_srt: str):
+    """将新生成的字幕放入内容缓存，超过 SRT_CACHE_MAX_FILES 时删除最久未使用的"""
+    try:
+        os.makedirs(cache_dir, exist_ok=True)
+        _link_or_copy(srt_path, cached_srt)
+        
+        entries = sorted(
+            (entry for entry in os.scandir(cache_dir) if entry.name.endswith('.srt')),
+            key=lambda entry: entry.stat().st_mtime
+        )
+        for entry in entries[:max(0, len(entries) - SRT_CACHE_MAX_FILES)]:
+            os.remove(entry.path)
+    except OSError as e:
+        print(f"写入字幕缓存失败: {e}")
+
+
+def find_existing_subtitles(video_path: str, output_dir: str) -> Optional[str]:
+    """
+    查找视频已有的字幕文件（视频目录、输出目录、字幕内容缓存），找到时放到输出目录并返回路径
+    没有时返回 None
+    """
     video_name = Path(video_path).stem
     # 清理文件名中的多余空格
     video_name_cleaned = sanitize_filename(video_name)
@@ -157,7 +486,7 @@ def extract_subtitles(video_path: str, output_dir: str) -> str:
     # 检查视频目录
     for name in possible_names:
         srt_path = os.path.join(video_dir, name)
-        if os.path.exists(srt_path) and os.path.getsize(srt_path) > 0:
+        if file_exists_and_not_empty(srt_path):
             print(f"发现已存在的字幕文件: {srt_path}")
             # 如果不在输出目录，复制一份到输出目录
             target_path = os.path.join(output_dir, name)
@@ -171,62 +500,159 @@ def extract_subtitles(video_path: str, output_dir: str) -> str:
     # 检查输出目录
     for name in possible_names:
         srt_path = os.path.join(output_dir, name)
-        if os.path.exists(srt_path) and os.path.getsize(srt_path) > 0:
+        if file_exists_and_not_empty(srt_path):
             print(f"发现已存在的字幕文件: {srt_path}")
             return srt_path
     
-    # 没有找到现有字幕文件，运行 faster-whisper-xxl
+    # 按视频内容查找字幕缓存（视频被改名或移动后仍可命中）
+    cache_dir = os.path.join(video_dir, SRT_CACHE_DIRNAME)
+    cached_srt = os.path.join(cache_dir, f"{_video_content_key(video_path)}.srt")
+    if file_exists_and_not_empty(cached_srt):
+        target_path = os.path.join(output_dir, f"{video_name_cleaned}.srt")
+        os.makedirs(output_dir, exist_ok=True)
+        _link_or_copy(cached_srt, target_path)
+        os.utime(cached_srt)  # 更新修改时间，淘汰时按最近使用排序
+        print(f"使用缓存的字幕文件: {cached_srt}")
+        return target_path
+    
+    return None
+
+
+def run_whisper(video_paths: List[str], output_dir: str) -> bool:
+    """运行一次 faster-whisper-xxl 识别一个或多个视频，SRT 写入 output_dir"""
     # 注意：使用列表形式传递参数，subprocess 会自动处理空格
     cmd = [
         WHISPER_EXE,
-        video_path,
+        *video_paths,
         "--output_format", "srt",
         "--output_dir", output_dir
     ]
     
     try:
-        result = subprocess.run(cmd, capture_output=True, text=True, encoding='utf-8')
+        # 语音识别占用大量 GPU / 内存，多个视频并行处理时也一次只运行一个
+        with _whisper_lock:
+            # 识别进度输出量很大，直接丢弃；stderr 只在失败时解码
+            result = subprocess.run(
+                cmd,
+                stdin=subprocess.DEVNULL,
+                stdout=subprocess.DEVNULL,
+                stderr=subprocess.PIPE
+            )
         if result.returncode != 0:
-            print(f"字幕提取失败: {result.stderr}")
-            return None
+            print(f"字幕提取失败: {result.stderr.decode('utf-8', errors='replace')}")
+            return False
+        return True
     except Exception as e:
         print(f"运行 faster-whisper-xxl 出错: {e}")
+        return False
+
+
+def _find_generated_srt(output_dir: str, video_name: str) -> Optional[str]:
+    """在 faster-whisper-xxl 的输出目录中查找视频对应的 SRT 文件"""
+    for name in (f"{video_name}.srt", f"{sanitize_filename(video_name)}.srt"):
+        candidate = os.path.join(output_dir, name)
+        if file_exists_and_not_empty(candidate):
+            return candidate
+    return None
+
+
+def extract_subtitles(video_path: str, output_dir: str) -> str:
+    """使用 faster-whisper-xxl 提取字幕，或使用已存在的字幕文件"""
+    print(f"正在提取字幕: {video_path}")
+    
+    srt_path = find_existing_subtitles(video_path, output_dir)
+    if srt_path:
+        return srt_path
+    
+    # 没有找到现有字幕文件，运行 faster-whisper-xxl
+    video_path = os.path.abspath(video_path)
+    output_dir = os.path.abspath(output_dir)
+    if not run_whisper([video_path], output_dir):
         return None
     
     # 查找生成的 SRT 文件 - 尝试多种可能的文件名
-    possible_names = [
-        f"{video_name}.srt",           # 原始文件名
-        f"{video_name_cleaned}.srt",   # 清理后的文件名
-    ]
-    
-    for name in possible_names:
-        srt_path = os.path.join(output_dir, name)
-        if os.path.exists(srt_path):
-            print(f"字幕文件已生成: {srt_path}")
-            return srt_path
+    srt_path = _find_generated_srt(output_dir, Path(video_path).stem)
+    if not srt_path:
+        # 尝试查找任何 SRT 文件（处理工具可能生成不同名称的情况），找到第一个非空文件即停止
+        with os.scandir(output_dir) as entries:
+            for entry in entries:
+                if entry.name.lower().endswith('.srt') and file_exists_and_not_empty(entry):
+                    srt_path = entry.path
+                    break
     
-    # 尝试查找任何 SRT 文件（处理工具可能生成不同名称的情况）
-    for file in os.listdir(output_dir):
-        if file.lower().endswith('.srt'):
-            srt_path = os.path.join(output_dir, file)
-            print(f"字幕文件已生成: {srt_path}")
-            return srt_path
+    if not srt_path:
+        print("未找到生成的 SRT 文件")
+        return None
     
-    print("未找到生成的 SRT 文件")
-    return None
+    print(f"字幕文件已生成: {srt_path}")
+    cache_dir = os.path.join(os.path.dirname(video_path), SRT_CACHE_DIRNAME)
+    _store_srt_cache(srt_path, cache_dir, os.path.join(cache_dir, f"{_video_content_key(video_path)}.srt"))
+    return srt_path
+
+
+def extract_subtitles_batch(videos: List[Tuple[str, str]]):
+    """
+    为多个视频预先生成字幕：videos 为 [(视频路径, 输出目录), ...]
+    没有现成字幕的视频由一次 faster-whisper-xxl 调用识别（每批最多 WHISPER_BATCH_SIZE 个，
+    模型只加载一次），生成的 SRT 放到各自的输出目录并写入内容缓存；
+    之后 extract_subtitles 会直接找到这些字幕，未成功的视频仍会逐个重试
+    """
+    pending = [
+        (os.path.abspath(video_path), os.path.abspath(output_dir))
+        for video_path, output_dir in videos
+        if not find_existing_subtitles(video_path, output_dir)
+    ]
+    if not pending:
+        return
+    
+    for batch_start in range(0, len(pending), WHISPER_BATCH_SIZE):
+        batch = pending[batch_start:batch_start + WHISPER_BATCH_SIZE]
+        cache_dir = os.path.join(os.path.dirname(batch[0][0]), SRT_CACHE_DIRNAME)
+        batch_dir = os.path.join(cache_dir, "batch")
+        os.makedirs(batch_dir, exist_ok=True)
+        
+        print(f"正在批量提取 {len(batch)} 个视频的字幕...")
+        # 部分视频失败时其余视频的字幕仍可使用，不检查返回值
+        run_whisper([video_path for video_path, _ in batch], batch_dir)
+        
+        for video_path, output_dir in batch:
+            video_name = Path(video_path).stem
+            generated = _find_generated_srt(batch_dir, video_name)
+            if not generated:
+                continue
+            os.makedirs(output_dir, exist_ok=True)
+            srt_path = os.path.join(output_dir, f"{sanitize_filename(video_name)}.srt")
+            shutil.move(generated, srt_path)
+            video_cache_dir = os.path.join(os.path.dirname(video_path), SRT_CACHE_DIRNAME)
+            _store_srt_cache(srt_path, video_cache_dir,
+                             os.path.join(video_cache_dir, f"{_video_content_key(video_path)}.srt"))
+        
+        shutil.rmtree(batch_dir, ignore_errors=True)
+
+
+def compress_subtitles_for_prompt(subtitles: List[SRTSubtitle]) -> str:
+    """
+    将字幕压缩为每行 "序号 (时长): 文本" 的形式发送给 ChatGPT
+    去掉毫秒时间戳和空行，token 数约为原始 SRT 的 1/3
+    """
+    return "\n".join(
+        f"{s.index} ({s.get_duration():.1f}s): {_WS_RE.sub(' ', s.text)}"
+        for s in subtitles
+    )
 
 
-def select_clips_with_chatgpt(srt_content: str, api_key: str, clip_count: int = 10) -> List[int]:
+def select_and_translate_with_chatgpt(subtitles: List[SRTSubtitle], video_title: str, clip_count: int,
+                                     api_key: str) -> Tuple[List[int], Dict[int, str], str]:
     """
-    使用 ChatGPT 选择适合儿童配音的字幕片段
-    返回选中的字幕序号列表
+    使用 ChatGPT 一次请求完成：选择适合儿童配音的字幕片段 + 翻译选中的字幕和视频标题
+    返回: (选中的字幕序号列表, {字幕序号: 中文翻译}, 标题翻译)
     """
-    print(f"正在使用 ChatGPT 选择 {clip_count} 条适合配音的字幕...")
+    print(f"正在使用 ChatGPT 选择并翻译 {clip_count} 条适合配音的字幕...")
     
-    client = OpenAI(api_key=api_key)
+    client = get_openai_client(api_key)
     
-    prompt = f"""这是一个SRT字幕文件的内容，我在做一个儿童配音项目。
-请从中选择大约{clip_count}条最适合儿童配音的字幕。
+    prompt = f"""这是一个视频的字幕内容，我在做一个儿童配音项目。
+请从中选择大约{clip_count}条最适合儿童配音的字幕，并把选中的字幕和视频标题翻译为中文，适合儿童阅读。
 
 选择标准：
 1. 语句清晰、发音标准
@@ -235,32 +661,47 @@ def select_clips_with_chatgpt(srt_content: str, api_key: str, clip_count: int =
 4. 语气生动有趣
 5. 避免复杂词汇或难以发音的内容
 
-请只返回一个JSON数组，包含选中字幕的序号（index），格式如下：
-{{"selected_indices": [1, 3, 5, 7, ...]}}
+视频标题: {video_title}
 
-SRT字幕内容:
-{srt_content}
+请只返回JSON，index 为字幕序号，格式如下：
+{{
+    "title": "视频标题的中文翻译",
+    "selections": [{{"index": 1, "translation_cn": "中文翻译"}}, ...]
+}}
+
+字幕内容（每行格式为 "序号 (时长): 文本"）:
+{compress_subtitles_for_prompt(subtitles)}
 """
     
     try:
-        response = client.chat.completions.create(
+        result = chat_completion_json(
+            client,
             model="gpt-4o",
             messages=[
-                {"role": "system", "content": "你是一个专业的儿童配音项目助手，帮助选择适合儿童配音练习的动画片段。只返回JSON格式的结果。"},
+                {"role": "system", "content": "你是一个专业的儿童配音项目助手，帮助选择适合儿童配音练习的动画片段，并翻译为适合儿童的中文。只返回JSON格式的结果。"},
                 {"role": "user", "content": prompt}
             ],
-            temperature=0.7,
+            temperature=0.5,
             response_format={"type": "json_object"}
         )
         
-        result = json.loads(response.choices[0].message.content)
-        selected_indices = result.get("selected_indices", [])
+        selected_indices = []
+        translations = {}
+        for item in result.get("selections", []):
+            try:
+                index = int(item["index"])
+            except (KeyError, TypeError, ValueError):
+                continue
+            selected_indices.append(index)
+            if item.get("translation_cn"):
+                translations[index] = item["translation_cn"]
+        title_cn = result.get("title") or video_title
         print(f"ChatGPT 选择了 {len(selected_indices)} 条字幕: {selected_indices}")
-        return selected_indices
+        return selected_indices, translations, title_cn
         
     except Exception as e:
         print(f"调用 ChatGPT API 出错: {e}")
-        return []
+        return [], {}, video_title
 
 
 def translate_all_with_chatgpt(texts: List[str], video_title: str, api_key: str) -> Tuple[Dict[str, str], str]:
@@ -270,7 +711,7 @@ def translate_all_with_chatgpt(texts: List[str], video_title: str, api_key: str)
     """
     print("正在翻译字幕和标题...")
     
-    client = OpenAI(api_key=api_key)
+    client = get_openai_client(api_key)
     
     texts_json = json.dumps(texts, ensure_ascii=False)
     
@@ -289,7 +730,8 @@ def translate_all_with_chatgpt(texts: List[str], video_title: str, api_key: str)
 """
     
     try:
-        response = client.chat.completions.create(
+        result = chat_completion_json(
+            client,
             model="gpt-4o",
             messages=[
                 {"role": "system", "content": "你是一个专业的翻译，专注于儿童内容的翻译。只返回JSON格式的结果。"},
@@ -299,7 +741,6 @@ def translate_all_with_chatgpt(texts: List[str], video_title: str, api_key: str)
             response_format={"type": "json_object"}
         )
         
-        result = json.loads(response.choices[0].message.content)
         translations = result.get("subtitles", {})
         title_cn = result.get("title", video_title)
         print(f"翻译完成: 标题 + {len(translations)} 条字幕")
@@ -310,25 +751,205 @@ def translate_all_with_chatgpt(texts: List[str], video_title: str, api_key: str)
         return {}, video_title
 
 
-def extract_video_clip(video_path: str, start_time: float, end_time: float, 
-                       output_path: str) -> bool:
-    """使用 ffmpeg 截取视频片段"""
-    duration = end_time - start_time
+def _translation_cache_key(text: str) -> str:
+    return _WS_RE.sub(' ', text).strip().lower()
+
+
+def load_translation_cache(cache_path: str) -> Dict[str, str]:
+    """读取翻译缓存，文件不存在或损坏时返回空字典"""
+    if not file_exists_and_not_empty(cache_path):
+        return {}
+    try:
+        return read_json_file(cache_path)
+    except Exception as e:
+        print(f"读取翻译缓存失败: {e}")
+        return {}
+
+
+def update_translation_cache(cache_path: str, translations: Dict[str, str]):
+    """把新的翻译合并进缓存文件（多个视频并行处理时加锁，先写临时文件再替换）"""
+    if not translations:
+        return
+    with _translation_cache_lock:
+        cache = load_translation_cache(cache_path)
+        cache.update((_translation_cache_key(text), cn) for text, cn in translations.items())
+        tmp_path = f"{cache_path}.tmp"
+        try:
+            write_json_file(tmp_path, cache)
+            os.replace(tmp_path, cache_path)
+        except OSError as e:
+            print(f"写入翻译缓存失败: {e}")
+
+
+def load_video_state(state_path: str) -> Dict:
+    """读取视频处理的中间结果，文件不存在或损坏时返回空字典"""
+    if not file_exists_and_not_empty(state_path):
+        return {}
+    try:
+        return read_json_file(state_path)
+    except Exception as e:
+        print(f"读取中间结果失败: {e}")
+        return {}
+
+
+def save_video_state(state_path: str, state: Dict):
+    """保存视频处理的中间结果（先写临时文件再替换）"""
+    tmp_path = f"{state_path}.tmp"
+    try:
+        write_json_file(tmp_path, state)
+        os.replace(tmp_path, state_path)
+    except OSError as e:
+        print(f"保存中间结果失败: {e}")
+
+
+def run_ffmpeg(args: List[str]) -> subprocess.CompletedProcess:
+    """
+    运行 ffmpeg：只输出错误信息，丢弃 stdout，不读取 stdin
+    stderr 只在失败时解码为字符串（成功时为空字符串），调用方在失败时打印
+    """
+    result = subprocess.run(
+        [FFMPEG_EXE, "-hide_banner", "-loglevel", "error", "-nostats", "-nostdin", *args],
+        stdin=subprocess.DEVNULL,
+        stdout=subprocess.DEVNULL,
+        stderr=subprocess.PIPE
+    )
+    result.stderr = result.stderr.decode('utf-8', errors='replace') if result.returncode != 0 else ""
+    return result
+
+
+@functools.lru_cache(maxsize=1)
+def detect_hw_encoder() -> Optional[str]:
+    """检测 ffmpeg 可用的硬件 H.264 编码器（只检测一次），没有时返回 None"""
+    if PROCESS_VIDEO_HW_ENCODER in _HW_ENCODER_ARGS:
+        return PROCESS_VIDEO_HW_ENCODER
+    if PROCESS_VIDEO_HW_ENCODER != 'auto':
+        return None
+    
+    try:
+        result = subprocess.run(
+            [FFMPEG_EXE, "-hide_banner", "-encoders"],
+            stdin=subprocess.DEVNULL,
+            stdout=subprocess.PIPE,
+            stderr=subprocess.DEVNULL,
+            text=True, encoding='utf-8', errors='replace',
+            timeout=10
+        )
+    except (OSError, subprocess.TimeoutExpired) as e:
+        print(f"检测 ffmpeg 编码器失败: {e}")
+        return None
     
+    for encoder in _HW_ENCODER_ARGS:
+        if encoder in result.stdout:
+            print(f"重新编码片段时使用硬件编码器: {encoder}")
+            return encoder
+    return None
+
+
+@functools.lru_cache(maxsize=32)
+def get_keyframe_times(video_path: str) -> Tuple[float, ...]:
+    """
+    获取视频第一路视频流的关键帧时间（秒，升序），每个视频只扫描一次
+    只读取 packet 的时间戳和标志位，不解码画面；ffprobe 失败时返回空元组
+    """
     cmd = [
-        FFMPEG_EXE,
-        "-y",  # 覆盖已存在的文件
-        "-i", video_path,
-        "-ss", str(start_time),
-        "-t", str(duration),
-        "-c:v", "libx264",
-        "-c:a", "aac",
-        "-strict", "experimental",
-        output_path
+        FFPROBE_EXE, "-v", "error",
+        "-select_streams", "v:0",
+        "-show_entries", "packet=pts_time,flags",
+        "-of", "csv=p=0",
+        video_path
     ]
     
     try:
-        result = subprocess.run(cmd, capture_output=True, text=True, encoding='utf-8')
+        result = subprocess.run(
+            cmd,
+            stdin=subprocess.DEVNULL,
+            stdout=subprocess.PIPE,
+            stderr=subprocess.PIPE,
+            text=True,
+            encoding='utf-8',
+            errors='replace'
+        )
+    except Exception as e:
+        print(f"运行 ffprobe 出错: {e}")
+        return ()
+    
+    if result.returncode != 0:
+        print(f"读取关键帧失败: {result.stderr}")
+        return ()
+    
+    times = []
+    for line in result.stdout.splitlines():
+        pts_time, _, flags = line.partition(",")
+        if "K" not in flags:
+            continue
+        try:
+            times.append(float(pts_time))
+        except ValueError:
+            continue
+    
+    return tuple(sorted(times))
+
+
+def snap_to_keyframe(keyframes: Tuple[float, ...], start_time: float) -> Tuple[float, bool]:
+    """
+    把片段起点前移到之前最近的关键帧
+    返回 (新起点, 是否需要重新编码)：没有关键帧信息时保持原起点复制流；
+    前移超过 KEYFRAME_MAX_SNAP_SECONDS 时保持原起点并重新编码该片段
+    """
+    if not keyframes:
+        return start_time, False
+    
+    pos = bisect.bisect_right(keyframes, start_time) - 1
+    if pos < 0 or start_time - keyframes[pos] > KEYFRAME_MAX_SNAP_SECONDS:
+        return start_time, True
+    return keyframes[pos], False
+
+
+def extract_video_clip(video_path: str, start_time: float, end_time: float, 
+                       output_path: str, threads: int = 1, reencode: bool = False) -> bool:
+    """
+    使用 ffmpeg 截取视频片段
+    源视频已是 H.264/AAC，默认直接复制音视频流（只做解封装 + 封装，不重新编码），
+    起点应已通过 snap_to_keyframe 对齐到关键帧；reencode=True 或复制流失败时重新编码，
+    起点精确，优先使用硬件编码器，失败时改用 libx264
+    """
+    duration = end_time - start_time
+    
+    def build_cmd(codec_args: List[str]) -> List[str]:
+        return [
+            "-y",  # 覆盖已存在的文件
+            "-threads", str(threads),
+            "-ss", str(start_time),
+            "-i", video_path,
+            "-t", str(duration),
+            *codec_args,
+            "-threads", str(threads),
+            output_path
+        ]
+    
+    # 复制流失败或生成空文件时改为重新编码
+    if not reencode:
+        try:
+            result = run_ffmpeg(build_cmd(["-c", "copy", "-avoid_negative_ts", "make_zero"]))
+            if result.returncode == 0 and file_exists_and_not_empty(output_path):
+                return True
+            print(f"复制流截取失败，改为重新编码: {result.stderr}")
+        except Exception as e:
+            print(f"运行 ffmpeg 出错，改为重新编码: {e}")
+    
+    encoder = None if _hw_encoder_failed.is_set() else detect_hw_encoder()
+    if encoder:
+        try:
+            result = run_ffmpeg(build_cmd([*_HW_ENCODER_ARGS[encoder], "-c:a", "aac"]))
+            if result.returncode == 0:
+                return True
+            print(f"硬件编码失败，改用 libx264: {result.stderr}")
+        except Exception as e:
+            print(f"运行 ffmpeg 出错，改用 libx264: {e}")
+        _hw_encoder_failed.set()
+    
+    try:
+        result = run_ffmpeg(build_cmd([*_SOFTWARE_ENCODE_ARGS, "-c:a", "aac"]))
         if result.returncode == 0:
             return True
         else:
@@ -339,30 +960,99 @@ def extract_video_clip(video_path: str, start_time: float, end_time: float,
         return False
 
 
-def extract_thumbnail(video_path: str, time_point: float, output_path: str) -> bool:
-    """从视频中提取缩略图"""
+def extract_video_clips(video_path: str, clips: List[Tuple[float, float, str]], threads: int = 1) -> bool:
+    """
+    一个 ffmpeg 进程截取多个视频片段（复制流，不重新编码）
+    clips: [(开始时间, 结束时间, 输出路径), ...]；每个片段作为一个带 -ss / -t 的输入，
+    只读取片段所在的数据，重叠或不连续的片段都可以处理
+    """
+    cmd = ["-y", "-threads", str(threads)]
+    for start_time, end_time, _ in clips:
+        cmd += ["-ss", str(start_time), "-t", str(end_time - start_time), "-i", video_path]
+    for i, (_, _, output_path) in enumerate(clips):
+        cmd += [
+            "-map", f"{i}:v:0", "-map", f"{i}:a:0?",
+            "-c", "copy",
+            "-avoid_negative_ts", "make_zero",
+            output_path
+        ]
+    
+    try:
+        result = run_ffmpeg(cmd)
+        if result.returncode != 0:
+            print(f"批量截取视频片段失败: {result.stderr}")
+            return False
+        return True
+    except Exception as e:
+        print(f"运行 ffmpeg 出错: {e}")
+        return False
+
+
+def extract_thumbnail(video_path: str, time_point: float, output_path: str, threads: int = 1) -> bool:
+    """
+    从视频中提取缩略图
+    -ss 放在 -i 之前按索引定位到之前的关键帧，只解码该关键帧到时间点之间的画面
+    """
     cmd = [
-        FFMPEG_EXE,
         "-y",
-        "-i", video_path,
+        "-threads", str(threads),
         "-ss", str(time_point),
+        "-i", video_path,
         "-vframes", "1",
         "-q:v", "2",
+        "-an",
+        "-threads", str(threads),
         output_path
     ]
     
     try:
-        result = subprocess.run(cmd, capture_output=True, text=True, encoding='utf-8')
+        result = run_ffmpeg(cmd)
         return result.returncode == 0
     except Exception as e:
         print(f"提取缩略图出错: {e}")
         return False
 
 
+def extract_all_thumbnails(video_path: str, thumbnails: List[Tuple[float, str]], threads: int = 1) -> bool:
+    """
+    一个 ffmpeg 进程提取多张缩略图
+    thumbnails: [(时间点, 输出路径), ...]；每个时间点作为一个带 -ss 的输入（按索引快速定位），
+    分别映射到各自的输出，避免为每张图片单独启动 ffmpeg
+    """
+    if not thumbnails:
+        return True
+    
+    cmd = ["-y", "-threads", str(threads)]
+    for time_point, _ in thumbnails:
+        cmd += ["-ss", str(time_point), "-i", video_path]
+    for i, (_, output_path) in enumerate(thumbnails):
+        cmd += ["-map", f"{i}:v:0", "-frames:v", "1", "-q:v", "2", output_path]
+    
+    try:
+        result = run_ffmpeg(cmd)
+        if result.returncode != 0:
+            print(f"批量提取缩略图失败: {result.stderr}")
+            return False
+        return True
+    except Exception as e:
+        print(f"提取缩略图出错: {e}")
+        return False
+
+
+def extract_thumbnails(video_path: str, thumbnails: List[Tuple[float, str]], threads: int = 1):
+    """批量提取缩略图，失败时逐张提取缺失的缩略图"""
+    if extract_all_thumbnails(video_path, thumbnails, threads):
+        return
+    for time_point, output_path in thumbnails:
+        if not file_exists_and_not_empty(output_path):
+            extract_thumbnail(video_path, time_point, output_path, threads)
+
+
 def process_single_video(video_path: str, output_dir: str, api_key: str, 
-                         clip_count: int = 10) -> Optional[Dict]:
+                         clip_count: int = 10, jobs: int = 1) -> Optional[Dict]:
     """
     处理单个视频文件
+    jobs 为同时处理的视频数，用于分配每个 ffmpeg 进程的线程数
     返回生成的 JSON 数据
     """
     video_path = os.path.abspath(video_path)
@@ -391,11 +1081,26 @@ def process_single_video(video_path: str, output_dir: str, api_key: str,
         print("没有字幕内容，跳过此视频")
         return None
     
-    # 步骤2: 使用 ChatGPT 选择字幕
-    with open(srt_path, 'r', encoding='utf-8') as f:
-        srt_content = f.read()
-    
-    selected_indices = select_clips_with_chatgpt(srt_content, api_key, clip_count)
+    # 步骤2: 使用 ChatGPT 选择字幕（同一请求中翻译选中的字幕和标题）
+    # 之前的运行已拿到结果时直接使用，不再重复请求
+    state_path = os.path.join(output_dir, VIDEO_STATE_FILENAME)
+    state = load_video_state(state_path)
+    if state.get("selected_indices"):
+        print("使用已保存的 ChatGPT 选择结果")
+        selected_indices = state["selected_indices"]
+        translations_by_index = {int(k): v for k, v in state.get("translations_by_index", {}).items()}
+        title_cn = state.get("title_cn", video_name)
+    else:
+        selected_indices, translations_by_index, title_cn = select_and_translate_with_chatgpt(
+            subtitles, video_name, clip_count, api_key
+        )
+        if selected_indices:
+            state = {
+                "selected_indices": selected_indices,
+                "translations_by_index": translations_by_index,
+                "title_cn": title_cn
+            }
+            save_video_state(state_path, state)
     
     if not selected_indices:
         print("ChatGPT 没有返回有效的选择，使用前10条字幕")
@@ -414,23 +1119,46 @@ def process_single_video(video_path: str, output_dir: str, api_key: str,
         print("没有匹配到字幕，跳过此视频")
         return None
     
-    # 一次性翻译字幕和标题
-    texts_to_translate = [s.text for s in selected_subtitles]
-    translations, title_cn = translate_all_with_chatgpt(texts_to_translate, video_name, api_key)
+    # 选择时已一并翻译；没有拿到翻译时（如使用默认的前几条字幕）再单独翻译一次
+    translations = {
+        subtitle.text: translations_by_index[subtitle.index]
+        for subtitle in selected_subtitles if subtitle.index in translations_by_index
+    }
+    translations.update(state.get("translations", {}))
+    
+    # 相同的字幕只翻译一次，先查跨视频的翻译缓存
+    translation_cache_path = os.path.join(os.path.dirname(video_path), TRANSLATION_CACHE_FILENAME)
+    texts_to_translate = [
+        text for text in dict.fromkeys(s.text for s in selected_subtitles) if text not in translations
+    ]
+    if texts_to_translate:
+        translation_cache = load_translation_cache(translation_cache_path)
+        for text in texts_to_translate:
+            cached = translation_cache.get(_translation_cache_key(text))
+            if cached:
+                translations[text] = cached
+        texts_to_translate = [text for text in texts_to_translate if text not in translations]
+    if texts_to_translate:
+        extra_translations, extra_title_cn = translate_all_with_chatgpt(texts_to_translate, video_name, api_key)
+        translations.update(extra_translations)
+        if title_cn == video_name:
+            title_cn = extra_title_cn
+        if extra_translations and state.get("selected_indices"):
+            state.update(translations=translations, title_cn=title_cn)
+            save_video_state(state_path, state)
+    update_translation_cache(translation_cache_path, translations)
     
     # 步骤4 & 5: 截取视频片段并生成 JSON
-    clips = []
     clips_dir = os.path.join(output_dir, "clips")
     thumbnails_dir = os.path.join(output_dir, "thumbnails")
     os.makedirs(clips_dir, exist_ok=True)
     os.makedirs(thumbnails_dir, exist_ok=True)
     
-    # 提取主缩略图
+    # 并行的 ffmpeg 进程数（jobs 个视频 × CLIP_WORKERS）与每个进程的线程数一起确定，避免线程总数远超 CPU 核数
+    ffmpeg_threads = _ffmpeg_threads_per_invocation(max(1, jobs) * CLIP_WORKERS)
+    
     main_thumbnail = "main.jpg"
     main_thumbnail_path = os.path.join(thumbnails_dir, main_thumbnail)
-    if selected_subtitles:
-        extract_thumbnail(video_path, selected_subtitles[0].get_start_seconds(), 
-                         main_thumbnail_path)
     
     # 准备所有片段的任务数据
     PADDING_SECONDS = 1.0
@@ -454,67 +1182,77 @@ def process_single_video(video_path: str, output_dir: str, api_key: str,
             "clip_end": clip_end
         })
     
-    def process_clip(task):
-        """处理单个片段的函数"""
-        i = task["index"]
-        subtitle = task["subtitle"]
-        clip_path = task["clip_path"]
-        thumbnail_path = task["thumbnail_path"]
-        clip_start = task["clip_start"]
-        clip_end = task["clip_end"]
+    # 片段起点对齐到关键帧，复制流截取时片段时长与 JSON 中的时间一致
+    keyframes = get_keyframe_times(video_path)
+    for task in tasks:
+        task["clip_start"], task["reencode"] = snap_to_keyframe(keyframes, task["clip_start"])
+    
+    # clips 数据按片段序号预先生成，截取失败的片段置为 None
+    clip_slots: List[Optional[Dict]] = [
+        {
+            "video_url": f"clips/{task['clip_filename']}",
+            "original_text": task["subtitle"].text,
+            "translation_cn": translations.get(task["subtitle"].text, task["subtitle"].text),
+            "thumbnail": f"thumbnails/{task['thumbnail_filename']}",
+            "duration": round(task["clip_end"] - task["clip_start"], 2)
+        }
+        for task in tasks
+    ]
+    
+    # 需要截取的片段按开始时间排序（已存在的跳过）
+    pending_tasks = sorted(
+        (task for task in tasks if not file_exists_and_not_empty(task["clip_path"])),
+        key=lambda task: task["clip_start"]
+    )
+    
+    # 主缩略图和缺失的片段缩略图由一个 ffmpeg 进程提取
+    thumbnail_jobs = [(selected_subtitles[0].get_start_seconds(), main_thumbnail_path)]
+    thumbnail_jobs += [
+        (task["subtitle"].get_start_seconds() + 0.5, task["thumbnail_path"])
+        for task in tasks if not file_exists_and_not_empty(task["thumbnail_path"])
+    ]
+    
+    print(f"正在处理 {len(pending_tasks)} 个片段...")
+    with ThreadPoolExecutor(max_workers=CLIP_WORKERS) as executor:
+        # 缩略图提取与片段截取同时进行
+        thumbnails_future = executor.submit(extract_thumbnails, video_path, thumbnail_jobs, ffmpeg_threads)
         
-        clip_success = True
+        # 需要重新编码的片段逐个并行截取
+        futures = {
+            executor.submit(extract_video_clip, video_path, task["clip_start"], task["clip_end"],
+                            task["clip_path"], ffmpeg_threads, True): task["index"]
+            for task in pending_tasks if task["reencode"]
+        }
         
-        # 截取视频片段
-        if file_exists_and_not_empty(clip_path):
-            pass  # 已存在，跳过
+        # 复制流的片段由一个 ffmpeg 进程截取；失败时逐个片段并行截取
+        copy_tasks = [task for task in pending_tasks if not task["reencode"]]
+        clip_jobs = [(task["clip_start"], task["clip_end"], task["clip_path"]) for task in copy_tasks]
+        if copy_tasks and not extract_video_clips(video_path, clip_jobs, ffmpeg_threads):
+            for task, job in zip(copy_tasks, clip_jobs):
+                futures[executor.submit(extract_video_clip, video_path, *job, ffmpeg_threads)] = task["index"]
         else:
-            clip_success = extract_video_clip(video_path, clip_start, clip_end, clip_path)
-        
-        # 提取缩略图
-        if not file_exists_and_not_empty(thumbnail_path):
-            extract_thumbnail(video_path, subtitle.get_start_seconds() + 0.5, thumbnail_path)
+            # 批量复制流生成的空文件（片段内没有可用的数据包）单独重新编码
+            for task, job in zip(copy_tasks, clip_jobs):
+                if not file_exists_and_not_empty(task["clip_path"]):
+                    futures[executor.submit(extract_video_clip, video_path, *job, ffmpeg_threads, True)] = task["index"]
         
-        return {
-            "task": task,
-            "success": clip_success
-        }
-    
-    # 并行处理所有片段
-    print(f"正在并行处理 {len(tasks)} 个片段...")
-    results = {}
-    with ThreadPoolExecutor(max_workers=4) as executor:
-        futures = {executor.submit(process_clip, task): task["index"] for task in tasks}
         for future in as_completed(futures):
             idx = futures[future]
             try:
-                result = future.result()
-                results[idx] = result
-                status = "完成" if result["success"] else "失败"
-                print(f"  片段 {idx}/{len(tasks)} {status}")
+                success = future.result()
+                print(f"  片段 {idx}/{len(tasks)} {'完成' if success else '失败'}")
             except Exception as e:
                 print(f"  片段 {idx}/{len(tasks)} 出错: {e}")
-                results[idx] = {"task": tasks[idx-1], "success": False}
-    
-    # 按顺序生成 clips 数据
-    for task in tasks:
-        i = task["index"]
-        result = results.get(i)
-        if not result or not result["success"]:
-            continue
+                success = False
+            if not success:
+                clip_slots[idx - 1] = None
         
-        subtitle = task["subtitle"]
-        translation = translations.get(subtitle.text, subtitle.text)
-        actual_duration = round(task["clip_end"] - task["clip_start"], 2)
-        
-        clip_data = {
-            "video_url": f"clips/{task['clip_filename']}",
-            "original_text": subtitle.text,
-            "translation_cn": translation,
-            "thumbnail": f"thumbnails/{task['thumbnail_filename']}",
-            "duration": actual_duration
-        }
-        clips.append(clip_data)
+        try:
+            thumbnails_future.result()
+        except Exception as e:
+            print(f"  提取缩略图出错: {e}")
+    
+    clips = [clip_data for clip_data in clip_slots if clip_data is not None]
     
     # 生成最终 JSON
     result = {
@@ -528,8 +1266,11 @@ def process_single_video(video_path: str, output_dir: str, api_key: str,
     
     # 保存 JSON 文件
     json_path = os.path.join(output_dir, f"{video_name}.json")
-    with open(json_path, 'w', encoding='utf-8') as f:
-        json.dump(result, f, ensure_ascii=False, indent=2)
+    write_json_file(json_path, result)
+    
+    # JSON 已生成，中间结果不再需要
+    if os.path.exists(state_path):
+        os.remove(state_path)
     
     print(f"\n完成! JSON 文件已保存: {json_path}")
     print(f"共生成 {len(clips)} 个视频片段")
@@ -545,30 +1286,30 @@ def generate_all_json(input_dir: str) -> List[Dict]:
     input_dir = os.path.abspath(input_dir)
     all_videos = []
     
-    # 遍历目录下的所有子目录
-    for item in os.listdir(input_dir):
-        item_path = os.path.join(input_dir, item)
-        
-        # 跳过文件，只处理目录
-        if not os.path.isdir(item_path):
-            continue
-        
-        # 查找子目录中的 JSON 文件（排除 summary.json 和 all.json）
-        json_files = [f for f in os.listdir(item_path) 
-                      if f.lower().endswith('.json') 
-                      and f.lower() not in ('summary.json', 'all.json')]
+    # 遍历目录下的所有子目录（跳过文件）
+    with os.scandir(input_dir) as entries:
+        subdirs = [entry for entry in entries if entry.is_dir()]
+    
+    for subdir in subdirs:
+        # 查找子目录中的 JSON 文件（排除 summary.json、all.json 和 .state.json 等隐藏文件）
+        with os.scandir(subdir.path) as entries:
+            json_path = next(
+                (entry.path for entry in entries
+                 if entry.name.lower().endswith('.json')
+                 and not entry.name.startswith('.')
+                 and entry.name.lower() not in ('summary.json', 'all.json')),
+                None
+            )
         
-        if json_files:
+        if json_path:
             # 使用第一个找到的 JSON 文件
-            json_path = os.path.join(item_path, json_files[0])
             try:
-                with open(json_path, 'r', encoding='utf-8') as f:
-                    video_data = json.load(f)
+                video_data = read_json_file(json_path)
                 
                 # 使用目录名作为 name（确保一致性）
                 all_videos.append({
                     "id": len(all_videos),
-                    "name": item  # 使用目录名
+                    "name": subdir.name  # 使用目录名
                 })
             except Exception as e:
                 print(f"读取 JSON 文件失败: {json_path}, 错误: {e}")
@@ -582,16 +1323,40 @@ def generate_all_json(input_dir: str) -> List[Dict]:
     
     # 保存 all.json
     all_json_path = os.path.join(input_dir, "all.json")
-    with open(all_json_path, 'w', encoding='utf-8') as f:
-        json.dump(all_videos, f, ensure_ascii=False, indent=2)
+    write_json_file(all_json_path, all_videos)
     
     print(f"已生成 all.json，包含 {len(all_videos)} 个视频目录")
     
     return all_videos
 
 
-def process_directory(input_dir: str, api_key: str, clip_count: int = 10, max_retries: int = 5):
-    """处理目录下的所有 MP4 文件，最多重试 max_retries 次确保所有文件都处理完成"""
+def process_pending_video(info: Dict, api_key: str, clip_count: int, jobs: int = 1) -> Optional[Dict]:
+    """处理目录中的单个视频，JSON 成功生成后删除原始 MP4 文件"""
+    result = process_single_video(
+        info["video_path"], 
+        info["output_dir"], 
+        api_key, 
+        clip_count,
+        jobs
+    )
+    
+    # 如果 JSON 文件已成功生成，删除原始 MP4 文件
+    if file_exists_and_not_empty(info["json_path"]):
+        try:
+            os.remove(info["video_path"])
+            print(f"已删除处理完成的 MP4 文件: {info['video_path']}")
+        except Exception as e:
+            print(f"删除 MP4 文件失败: {info['video_path']}, 错误: {e}")
+    
+    return result
+
+
+def process_directory(input_dir: str, api_key: str, clip_count: int = 10, max_retries: int = 5,
+                      jobs: int = 4):
+    """
+    处理目录下的所有 MP4 文件，最多重试 max_retries 次确保所有文件都处理完成
+    jobs 个视频并行处理
+    """
     input_dir = os.path.abspath(input_dir)
     
     # 检查目录是否存在
@@ -604,10 +1369,9 @@ def process_directory(input_dir: str, api_key: str, clip_count: int = 10, max_re
         sys.exit(1)
     
     # 查找所有 MP4 文件
-    mp4_files = []
-    for file in os.listdir(input_dir):
-        if file.lower().endswith('.mp4'):
-            mp4_files.append(os.path.join(input_dir, file))
+    with os.scandir(input_dir) as entries:
+        mp4_files = [entry.path for entry in entries
+                     if entry.is_file() and entry.name.lower().endswith('.mp4')]
     
     if not mp4_files:
         print(f"错误: 目录 {input_dir} 中没有找到 MP4 文件")
@@ -648,24 +1412,27 @@ def process_directory(input_dir: str, api_key: str, clip_count: int = 10, max_re
         print(f"待处理: {len(pending_videos)} 个视频，已完成: {len(mp4_files) - len(pending_videos)} 个")
         print(f"{'#'*60}")
         
-        # 处理未完成的视频
-        for info in pending_videos:
-            result = process_single_video(
-                info["video_path"], 
-                info["output_dir"], 
-                api_key, 
-                clip_count
-            )
-            if result:
-                results[info["video_name"]] = result
+        # 并行处理未完成的视频（OpenAI 请求和 ffmpeg 在不同视频之间重叠进行）
+        # 字幕按批识别（每批 jobs 个视频，一次 faster-whisper-xxl 调用只加载一次模型），
+        # 一批识别完成就提交处理，下一批识别与这批的 ChatGPT / ffmpeg 步骤同时进行
+        batch_size = max(1, jobs)
+        with ThreadPoolExecutor(max_workers=batch_size) as executor:
+            futures = {}
+            for batch_start in range(0, len(pending_videos), batch_size):
+                batch = pending_videos[batch_start:batch_start + batch_size]
+                extract_subtitles_batch([(info["video_path"], info["output_dir"]) for info in batch])
+                for info in batch:
+                    futures[executor.submit(process_pending_video, info, api_key, clip_count, batch_size)] = info
             
-            # 如果 JSON 文件已成功生成，删除原始 MP4 文件
-            if file_exists_and_not_empty(info["json_path"]):
+            for future in as_completed(futures):
+                info = futures[future]
                 try:
-                    os.remove(info["video_path"])
-                    print(f"已删除处理完成的 MP4 文件: {info['video_path']}")
+                    result = future.result()
                 except Exception as e:
-                    print(f"删除 MP4 文件失败: {info['video_path']}, 错误: {e}")
+                    print(f"处理视频出错: {info['video_path']}, 错误: {e}")
+                    continue
+                if result:
+                    results[info["video_name"]] = result
         
         # 检查本轮处理后的结果
         completed_count = sum(1 for info in video_info if file_exists_and_not_empty(info["json_path"]))
@@ -682,39 +1449,60 @@ def process_directory(input_dir: str, api_key: str, clip_count: int = 10, max_re
         if failed_count > 0:
             print(f"\n警告: 达到最大重试次数 ({max_retries})，仍有 {failed_count} 个视频未完成处理")
     
-    # 收集所有已完成的结果（包括之前已存在的）
-    final_results = []
+    # 生成汇总 JSON (summary.json)：比上次 summary.json 旧的视频 JSON 直接沿用上次的汇总条目，不再读取
+    summary_path = os.path.join(input_dir, "summary.json")
+    all_json_path = os.path.join(input_dir, "all.json")
+    previous_entries = {}
+    summary_mtime = 0.0
+    if file_exists_and_not_empty(summary_path):
+        try:
+            summary_mtime = os.path.getmtime(summary_path)
+            previous_entries = {v["folder"]: v for v in read_json_file(summary_path).get("videos", [])}
+        except Exception as e:
+            print(f"读取上次的汇总文件失败: {e}")
+            previous_entries = {}
+    
+    summary_videos = []
+    reloaded_count = 0
     for info in video_info:
-        if file_exists_and_not_empty(info["json_path"]):
+        if not file_exists_and_not_empty(info["json_path"]):
+            continue
+        # 视频 JSON 的文件名即为其中的 title，也是汇总条目的 folder
+        entry = previous_entries.get(Path(info["json_path"]).stem)
+        if entry is None or os.path.getmtime(info["json_path"]) > summary_mtime:
             try:
-                with open(info["json_path"], 'r', encoding='utf-8') as f:
-                    result = json.load(f)
-                final_results.append(result)
+                r = read_json_file(info["json_path"])
             except Exception as e:
                 print(f"读取 JSON 文件失败: {info['json_path']}, 错误: {e}")
-    
-    # 生成汇总 JSON (summary.json)
-    summary = {
-        "total_videos": len(final_results),
-        "generated_at": datetime.now().isoformat(),
-        "videos": [
-            {
+                continue
+            entry = {
                 "title": r["title"],
                 "title_cn": r.get("title_cn", r["title"]),
                 "clip_count": len(r.get("clips", [])),
                 "folder": r["title"]
             }
-            for r in final_results
-        ]
-    }
+            reloaded_count += 1
+        summary_videos.append(entry)
     
-    summary_path = os.path.join(input_dir, "summary.json")
-    with open(summary_path, 'w', encoding='utf-8') as f:
-        json.dump(summary, f, ensure_ascii=False, indent=2)
-    
-    # 生成目录元数据 JSON (all.json) - 遍历所有子目录生成
-    all_videos = generate_all_json(input_dir)
-    all_json_path = os.path.join(input_dir, "all.json")
+    unchanged = (
+        reloaded_count == 0
+        and len(summary_videos) == len(previous_entries)
+        and file_exists_and_not_empty(all_json_path)
+    )
+    if unchanged:
+        # 没有新完成或更新的视频，summary.json 和 all.json 保持不变
+        print("视频 JSON 没有变化，跳过生成 summary.json 和 all.json")
+        all_videos = read_json_file(all_json_path)
+    else:
+        summary = {
+            "total_videos": len(summary_videos),
+            "generated_at": datetime.now().isoformat(),
+            "videos": summary_videos
+        }
+        write_json_file(summary_path, summary)
+        
+        # 生成目录元数据 JSON (all.json) - 遍历所有子目录生成
+        all_videos = generate_all_json(input_dir)
     
     # 复制第一集的 main.jpg 到 all.json 同目录
     if all_videos and len(all_videos) > 0:
@@ -734,7 +1522,7 @@ def process_directory(input_dir: str, api_key: str, clip_count: int = 10, max_re
     
     print(f"\n{'='*60}")
     print(f"全部处理完成!")
-    print(f"成功处理: {len(final_results)}/{len(mp4_files)} 个视频")
+    print(f"成功处理: {len(summary_videos)}/{len(mp4_files)} 个视频")
     print(f"汇总文件: {summary_path}")
     print(f"目录元数据: {all_json_path}")
     print(f"{'='*60}")
@@ -754,6 +1542,9 @@ def main():
     
   指定片段数量:
     python process_video.py video.mp4 --api-key YOUR_API_KEY --clips 15
+    
+  同时处理 8 个视频:
+    python process_video.py /path/to/videos --api-key YOUR_API_KEY --jobs 8
 
 配置文件:
   需要在脚本所在目录创建 .env 文件，内容如下:
@@ -776,6 +1567,23 @@ def main():
         default=10,
         help="要选择的配音片段数量 (默认: 10)"
     )
+    parser.add_argument(
+        "--jobs",
+        type=int,
+        default=4,
+        help="处理目录时并行处理的视频数量 (默认: 4)"
+    )
+    parser.add_argument(
+        "--encoder",
+        choices=list(ENCODER_CHOICES),
+        default=None,
+        help="片段需要重新编码时使用的编码器 (默认: auto，自动检测硬件编码器；cpu 为 libx264)"
+    )
+    parser.add_argument(
+        "--no-cache",
+        action="store_true",
+        help="不使用 ChatGPT 响应缓存，重新请求 API"
+    )
     parser.add_argument(
         "--output",
         help="输出目录 (默认: 与视频文件同目录，以视频名命名)",
@@ -784,6 +1592,12 @@ def main():
     
     args = parser.parse_args()
     
+    global OPENAI_CACHE_ENABLED, PROCESS_VIDEO_HW_ENCODER
+    if args.no_cache:
+        OPENAI_CACHE_ENABLED = False
+    if args.encoder:
+        PROCESS_VIDEO_HW_ENCODER = ENCODER_CHOICES[args.encoder]
+    
     # 检查 API Key (此时 .env 已经在脚本开头检查过，这里是额外检查)
     if not args.api_key:
         print("错误: 请提供 OpenAI API Key")
@@ -813,7 +1627,7 @@ def main():
         
     elif os.path.isdir(input_path):
         # 处理目录
-        process_directory(input_path, args.api_key, args.clips)
+        process_directory(input_path, args.api_key, args.clips, jobs=args.jobs)
         
     else:
         print(f"错误: 找不到输入路径: {input_path}")